@@ -0,0 +1,198 @@
+import argparse
+import gzip
+import http.server
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import typing
+import urllib.parse
+
+
+class LOCStandIn:
+    # Serves loc.gov-shaped collection listings, resources and JPEGs from memory
+    collection: str = "free-to-use/benchmark/"
+    # Recorded bodies link to loc.gov, rewritten to (prefix on the stand-in) so the crawl and
+    # downloads stay local, images are answered with the synthetic JPEG
+    recorded_hosts: typing.Tuple[typing.Tuple[bytes, str], ...] = (
+        (b"https://www.loc.gov/", ""),
+        (b"https://tile.loc.gov/", "images/"),
+    )
+
+    def __init__(
+        self,
+        items: int = 100,
+        pages_per_item: int = 2,
+        image_bytes: int = 200 * 1024,
+        latency: float = 0.0,
+        throttle_rate: float = 0.0,
+        retry_after: float = 0.0,
+        recorded: typing.Optional[str] = None,
+        seed: int = 0,
+    ) -> None:
+        self.items = items
+        self.pages_per_item = pages_per_item
+        self.latency = latency
+        # Share of requests answered with 429 to exercise backoff
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.image: bytes = b"\xff\xd8\xff\xe0" + os.urandom(max(image_bytes - 6, 0)) + b"\xff\xd9"
+        self.recorded: typing.Dict[str, str] = {}
+        self.recorded_directory: typing.Optional[str] = recorded
+        if recorded is not None:
+            self.load_recorded(recorded)
+        self.server: typing.Optional[http.server.ThreadingHTTPServer] = None
+
+    def load_recorded(self, directory: str) -> None:
+        # Replays a ResponseCache directory (dataset/response_cache.py) by path and page
+        index = sqlite3.connect(os.path.join(directory, "index.sqlite"))
+        try:
+            for key, url in index.execute("SELECT key, url FROM entries"):
+                parsed = urllib.parse.urlparse(url)
+                page: str = urllib.parse.parse_qs(parsed.query).get("sp", [""])[0]
+                self.recorded[f"{parsed.path.strip('/')}|{page}"] = key
+        finally:
+            index.close()
+
+    def collections(self) -> typing.List[str]:
+        # Listing roots of the recorded cache, first listing pages carry no sp parameter
+        if not self.recorded:
+            return [self.collection]
+        return sorted(
+            f"{path}/"
+            for path, page in (entry.split("|") for entry in self.recorded)
+            if not page and not path.startswith(("item/", "resource/"))
+        )
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def collection_page(self, page: int, page_size: int) -> dict:
+        start: int = (page - 1) * page_size
+        ids: range = range(start, min(start + page_size, self.items))
+        next_page: typing.Optional[dict] = None
+        if start + page_size < self.items:
+            next_page = {"url": f"{self.base_url}{self.collection}?c={page_size}&sp={page + 1}"}
+        return {
+            "content": {"set": {"items": [{"link": f"{self.base_url}item/{index}/"} for index in ids]}},
+            "next": next_page,
+        }
+
+    def resource(self, item: int, page: int) -> dict:
+        return {
+            "item": {
+                "date": str(1880 + item % 120),
+                "access_restricted": False,
+                "online_format": ["image"],
+                "notes": [f"Benchmark item {item}"] * 20,
+            },
+            "pagination": {"current": page, "total": self.pages_per_item},
+            "cite_this": {
+                "chicago": f"Benchmark item {item}, page {page}.",
+                "apa": f"Benchmark item {item}, page {page}.",
+                "mla": f"Benchmark item {item}, page {page}.",
+            },
+            "resources": [
+                {
+                    "files": [
+                        [
+                            {"mimetype": "image/jpeg", "url": f"{self.base_url}images/{item}-{page}-{size}.jpg", "width": size, "height": size}
+                            for size in (150, 640, 1024)
+                        ]
+                    ]
+                }
+            ],
+        }
+
+    def respond(self, path: str, query: dict) -> typing.Tuple[int, str, bytes]:
+        page: int = int(query.get("sp", ["1"])[0])
+        stripped: str = path.strip("/")
+        if stripped.startswith("images/"):
+            return 200, "image/jpeg", self.image
+        if self.recorded:
+            key: typing.Optional[str] = self.recorded.get(f"{stripped}|{query.get('sp', [''])[0]}")
+            if key is None:
+                return 404, "application/json", b"{}"
+            with gzip.open(os.path.join(self.recorded_directory, key[:2], key + ".gz"), "rb") as body_file:
+                body: bytes = body_file.read()
+            for host, prefix in self.recorded_hosts:
+                body = body.replace(host, f"{self.base_url}{prefix}".encode("utf-8"))
+            return 200, "application/json", body
+        if stripped == self.collection.strip("/"):
+            page_size: int = int(query.get("c", ["25"])[0])
+            return 200, "application/json", json.dumps(self.collection_page(page, page_size)).encode("utf-8")
+        if stripped.startswith("item/"):
+            item: int = int(stripped.split("/")[1])
+            if item >= self.items:
+                return 404, "application/json", b"{}"
+            return 200, "application/json", json.dumps(self.resource(item, page)).encode("utf-8")
+        return 404, "application/json", b"{}"
+
+    def start(self, port: int = 0) -> str:
+        stand_in = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                if stand_in.latency:
+                    time.sleep(stand_in.latency)
+                with stand_in.random_lock:
+                    throttled: bool = stand_in.random.random() < stand_in.throttle_rate
+                if throttled:
+                    self.send_response(429)
+                    self.send_header("Retry-After", str(stand_in.retry_after))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                parsed = urllib.parse.urlparse(self.path)
+                status, content_type, body = stand_in.respond(parsed.path, urllib.parse.parse_qs(parsed.query))
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="loc-stand-in", daemon=True).start()
+        return self.base_url
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the loc.gov JSON API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--recorded", default=None, help="Response cache directory to replay")
+    args = parser.parse_args()
+
+    stand_in = LOCStandIn(
+        items=args.items,
+        latency=args.latency,
+        throttle_rate=args.throttle_rate,
+        recorded=args.recorded,
+    )
+    base_url: str = stand_in.start(args.port)
+    for collection in stand_in.collections():
+        print(f"Serving on {base_url}{collection}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stand_in.stop()
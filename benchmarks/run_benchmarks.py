@@ -0,0 +1,184 @@
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import typing
+
+REPOSITORY: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [
+    os.path.join(REPOSITORY, "benchmarks"),
+    os.path.join(REPOSITORY, "dataset"),
+    os.path.join(REPOSITORY, "web", "flask-backend"),
+]
+
+from loc_stand_in import LOCStandIn
+
+
+def percentile(values: typing.List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered: list = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def peak_rss_mib() -> float:
+    # ru_maxrss is in KiB on Linux; every stage runs in its own process
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def summary(count: int, seconds: float, latencies: typing.List[float]) -> dict:
+    return {
+        "items": count,
+        "seconds": seconds,
+        "rate": count / seconds if seconds else 0.0,
+        "p50": percentile(latencies, 0.5) * 1000,
+        "p99": percentile(latencies, 0.99) * 1000,
+        "rss": peak_rss_mib(),
+    }
+
+
+def crawl_stage(base_url: str, collections: typing.List[str], store_path: str, workers: int) -> dict:
+    from checkpoint_store import CheckpointStore
+    from http_session import HTTPSession
+    from loc_crawler import ConcurrentCrawler, LOCCrawler
+
+    latencies: typing.List[float] = []
+
+    class TimedCrawler(ConcurrentCrawler):
+        def fetch_page(self, item_id: str, page: typing.Optional[int] = None) -> tuple:
+            start: float = time.perf_counter()
+            try:
+                return super().fetch_page(item_id, page)
+            finally:
+                latencies.append(time.perf_counter() - start)
+
+    crawler = LOCCrawler(session=HTTPSession(pool_size=workers, backoff_base=0.05))
+    crawler.base_url = base_url
+    store = CheckpointStore(store_path)
+    start: float = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for collection in collections:
+            TimedCrawler(crawler, workers=workers).crawl_collection(collection, store)
+    seconds: float = time.perf_counter() - start
+    store.close()
+    return summary(len(latencies), seconds, latencies)
+
+
+def download_stage(store_path: str, save_path: str, workers: int) -> dict:
+    from downloader import ConcurrentDownloadHandler
+
+    latencies: typing.List[float] = []
+
+    class TimedDownloader(ConcurrentDownloadHandler):
+        def download(self, id: str, page: int, url: str):
+            start: float = time.perf_counter()
+            try:
+                return super().download(id, page, url)
+            finally:
+                latencies.append(time.perf_counter() - start)
+
+    handler = TimedDownloader(store_path, save_path=save_path, workers=workers, per_host=workers)
+    start: float = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        handler.download_all()
+    return summary(len(latencies), time.perf_counter() - start, latencies)
+
+
+def ingest_stage(store_path: str, database_path: str, bulk: bool) -> dict:
+    from checkpoint_store import iter_dataset
+    from sqlite_stand_in import SQLiteDBHandler
+
+    latencies: typing.List[float] = []
+    pages: list = list(iter_dataset(store_path))
+
+    class TimedHandler(SQLiteDBHandler):
+        def add_full_item(self, item_id: str, page: int, item: dict, collections: list = []):
+            start: float = time.perf_counter()
+            try:
+                return super().add_full_item(item_id, page, item, collections)
+            finally:
+                latencies.append(time.perf_counter() - start)
+
+        def flush_bulk_rows(self, rows: typing.Dict[str, list]) -> int:
+            # Spread each chunk's latency over the pages in it
+            start: float = time.perf_counter()
+            page_count: int = len(rows["items"])
+            try:
+                return super().flush_bulk_rows(rows)
+            finally:
+                if page_count:
+                    latencies.extend([(time.perf_counter() - start) / page_count] * page_count)
+
+    handler = TimedHandler(database_path)
+    start: float = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if bulk:
+            handler.bulk_load_pages(iter(pages), chunk_size=500)
+        else:
+            handler.load_pages(iter(pages))
+    return summary(len(pages), time.perf_counter() - start, latencies)
+
+
+def run_isolated(function: typing.Callable, *args) -> dict:
+    # Separate process per stage so peak RSS is per stage, not cumulative
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(function, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline crawl, download and ingest benchmarks")
+    parser.add_argument("--sizes", default="100,1000", help="Items per run, comma separated")
+    parser.add_argument("--pages-per-item", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.02, help="Injected seconds per request")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--image-kib", type=int, default=200)
+    parser.add_argument("--recorded", default=None, help="Replay a response cache instead of synthetic items")
+    parser.add_argument("--stages", default="crawl,download,ingest,ingest-bulk")
+    args = parser.parse_args()
+    stages: typing.List[str] = args.stages.split(",")
+
+    print(f"{'stage':<12} {'size':>6} {'items':>7} {'items/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'peak RSS MiB':>13}")
+    for size in [int(size) for size in args.sizes.split(",")]:
+        stand_in = LOCStandIn(
+            items=size,
+            pages_per_item=args.pages_per_item,
+            image_bytes=args.image_kib * 1024,
+            latency=args.latency,
+            throttle_rate=args.throttle_rate,
+            recorded=args.recorded,
+        )
+        base_url: str = stand_in.start()
+        collections: typing.List[str] = stand_in.collections()
+        if not collections:
+            raise SystemExit(f"No collection listings recorded in {args.recorded}")
+        with tempfile.TemporaryDirectory() as directory:
+            store_path: str = os.path.join(directory, "images.sqlite")
+            images_path: str = os.path.join(directory, "images")
+            os.makedirs(images_path)
+            results: typing.Dict[str, dict] = {}
+            # Later stages read the crawl's output, so crawl always runs
+            results["crawl"] = run_isolated(crawl_stage, base_url, collections, store_path, args.workers)
+            if "download" in stages:
+                results["download"] = run_isolated(download_stage, store_path, images_path, args.workers)
+            if "ingest" in stages:
+                results["ingest"] = run_isolated(
+                    ingest_stage, store_path, os.path.join(directory, "row.sqlite"), False
+                )
+            if "ingest-bulk" in stages:
+                results["ingest-bulk"] = run_isolated(
+                    ingest_stage, store_path, os.path.join(directory, "bulk.sqlite"), True
+                )
+        stand_in.stop()
+
+        for stage, result in results.items():
+            print(
+                f"{stage:<12} {size:>6} {result['items']:>7} {result['rate']:>9.0f} "
+                f"{result['p50']:>8.2f} {result['p99']:>8.2f} {result['rss']:>13.1f}"
+            )
@@ -0,0 +1,108 @@
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import threading
+import typing
+
+REPOSITORY: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPOSITORY, "web", "flask-backend"))
+
+from db_handler import DBHandler
+
+SCHEMA_PATH: str = os.path.join(REPOSITORY, "web", "flask-backend", "database_schema.sql")
+
+STATS_TRIGGER: str = (
+    "CREATE TRIGGER create_stats AFTER INSERT ON items FOR EACH ROW BEGIN "
+    "INSERT INTO stats (item_id, page, views, skips) VALUES (new.item_id, new.page, 0, 0); END"
+)
+
+
+def sqlite_schema(path: str = SCHEMA_PATH) -> typing.List[str]:
+    # Translates the CREATE TABLE statements of the MariaDB dump
+    with open(path, "r") as schema_file:
+        dump: str = schema_file.read()
+    statements: typing.List[str] = []
+    indexes: typing.List[str] = []
+    for table, body in re.findall(r"CREATE TABLE `(\w+)` \((.*?)\n\)[^;]*;", dump, re.DOTALL):
+        lines: list = []
+        for line in body.strip().split("\n"):
+            line = line.strip().rstrip(",")
+            key = re.match(r"KEY `(\w+)` \((.*)\)", line)
+            if key is not None:
+                indexes.append(f"CREATE INDEX {key.group(1)} ON {table} ({key.group(2)})")
+                continue
+            lines.append(line)
+        statements.append(f"CREATE TABLE {table} (\n  " + ",\n  ".join(lines) + "\n)")
+    return statements + indexes + [STATS_TRIGGER]
+
+
+class SQLiteConnection:
+    # Gives sqlite3 the autocommit switch DBHandler flips on mariadb connections
+    def __init__(self, path: str) -> None:
+        self.connection = sqlite3.connect(path, timeout=30.0, isolation_level=None)
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.create_function("YEAR", 1, lambda value: int(str(value)[:4]) if value else None)
+
+    @property
+    def autocommit(self) -> bool:
+        return self.connection.isolation_level is None
+
+    @autocommit.setter
+    def autocommit(self, value: bool) -> None:
+        if self.connection.in_transaction and value:
+            self.connection.commit()
+        self.connection.isolation_level = None if value else "DEFERRED"
+
+    def cursor(self, buffered: bool = True) -> sqlite3.Cursor:
+        # sqlite3 cursors always step through results lazily
+        return self.connection.cursor()
+
+    def commit(self) -> None:
+        self.connection.commit()
+
+    def rollback(self) -> None:
+        self.connection.rollback()
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class SQLiteDBHandler(DBHandler):
+    # DBHandler running on a SQLite file created from database_schema.sql
+    integrity_errors: typing.Tuple[type, ...] = (sqlite3.IntegrityError,)
+    dialect: typing.List[typing.Tuple[str, str]] = [
+        ("INSERT IGNORE", "INSERT OR IGNORE"),
+        ("ON DUPLICATE KEY UPDATE", "ON CONFLICT DO UPDATE SET"),
+    ]
+
+    def __init__(self, path: str, metrics=None) -> None:
+        self.path = path
+        self.config: dict = {}
+        self.hasher = hashlib.sha256
+        self.checkout_timeout = 0.0
+        self.local = threading.local()
+        self.listeners: list = []
+        self.metrics = metrics
+        if not os.path.exists(path):
+            connection = sqlite3.connect(path)
+            for statement in sqlite_schema():
+                connection.execute(statement)
+            connection.commit()
+            connection.close()
+
+    def checkout(self) -> SQLiteConnection:
+        return SQLiteConnection(self.path)
+
+    def translate(self, query: str) -> str:
+        for mariadb_syntax, sqlite_syntax in self.dialect:
+            query = query.replace(mariadb_syntax, sqlite_syntax)
+        return re.sub(r"VALUES\((\w+)\)", r"excluded.\1", query)
+
+    def execute(self, cursor, query: str, parameters: typing.Sequence = ()):
+        return super().execute(cursor, self.translate(query), parameters)
+
+    def executemany(self, cursor, query: str, rows: typing.Sequence):
+        return super().executemany(cursor, self.translate(query), rows)
@@ -0,0 +1,182 @@
+import argparse
+import concurrent.futures
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import typing
+
+from checkpoint_store import iter_dataset
+
+
+class BlobStore:
+    root: str
+    shard_depth: int
+    extension: str
+
+    def __init__(self, root: str, shard_depth: int = 2, extension: str = "jpeg") -> None:
+        self.root = root
+        # Two levels of 256 directories keep every directory small
+        self.shard_depth = shard_depth
+        self.extension = extension
+        os.makedirs(os.path.join(root, "tmp"), exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            os.path.join(root, "index.sqlite"), timeout=30.0, check_same_thread=False
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            "digest TEXT PRIMARY KEY, "
+            "size INTEGER NOT NULL, "
+            "verified REAL)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS refs ("
+            "item_id TEXT NOT NULL, "
+            "page INTEGER NOT NULL, "
+            "digest TEXT NOT NULL REFERENCES blobs (digest), "
+            "PRIMARY KEY (item_id, page))"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS refs_digest ON refs (digest)")
+        self.connection.commit()
+
+    def path(self, digest: str) -> str:
+        shards: list = [digest[2 * level : 2 * level + 2] for level in range(self.shard_depth)]
+        return os.path.join(self.root, *shards, f"{digest}.{self.extension}")
+
+    def put_stream(self, chunks: typing.Iterable[bytes]) -> typing.Tuple[str, int]:
+        hasher = hashlib.sha256()
+        size: int = 0
+        file_descriptor, temp_path = tempfile.mkstemp(
+            dir=os.path.join(self.root, "tmp"), suffix=".part"
+        )
+        try:
+            # Hashed while streaming, the body is never held in memory
+            with os.fdopen(file_descriptor, "wb") as output_file:
+                for chunk in chunks:
+                    hasher.update(chunk)
+                    output_file.write(chunk)
+                    size += len(chunk)
+            digest: str = hasher.hexdigest()
+            path: str = self.path(digest)
+            if os.path.exists(path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO blobs (digest, size, verified) VALUES (?, ?, ?)",
+                (digest, size, time.time()),
+            )
+            self.connection.commit()
+        return digest, size
+
+    def put_file(self, path: str, chunk_size: int = 1024 * 1024) -> typing.Tuple[str, int]:
+        with open(path, "rb") as input_file:
+            return self.put_stream(iter(lambda: input_file.read(chunk_size), b""))
+
+    def link(self, item_id: str, page: int, digest: str) -> None:
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO refs (item_id, page, digest) VALUES (?, ?, ?)",
+                (item_id, int(page), digest),
+            )
+            self.connection.commit()
+
+    def lookup(self, item_id: str, page: int) -> typing.Optional[str]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT digest FROM refs WHERE item_id = ? AND page = ?",
+                (item_id, int(page)),
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def refs(self) -> typing.List[typing.Tuple[str, int, str]]:
+        with self.lock:
+            return self.connection.execute(
+                "SELECT item_id, page, digest FROM refs ORDER BY item_id, page"
+            ).fetchall()
+
+    def stats(self) -> typing.Dict[str, int]:
+        with self.lock:
+            blobs, size = self.connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs"
+            ).fetchone()
+            refs: int = self.connection.execute("SELECT COUNT(*) FROM refs").fetchone()[0]
+        return {"blobs": blobs, "bytes": size, "refs": refs, "deduplicated": refs - blobs}
+
+    def check(self, digest: str, chunk_size: int = 1024 * 1024) -> typing.Optional[str]:
+        path: str = self.path(digest)
+        hasher = hashlib.sha256()
+        try:
+            with open(path, "rb") as blob_file:
+                for chunk in iter(lambda: blob_file.read(chunk_size), b""):
+                    hasher.update(chunk)
+        except FileNotFoundError:
+            return "missing"
+        if hasher.hexdigest() != digest:
+            return "corrupt"
+        return None
+
+    def verify(self, workers: int = 8) -> typing.Dict[str, str]:
+        with self.lock:
+            digests: typing.List[str] = [
+                row[0] for row in self.connection.execute("SELECT digest FROM blobs")
+            ]
+        problems: typing.Dict[str, str] = {}
+        verified: list = []
+        # hashlib releases the GIL on large buffers, threads are enough
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            for digest, problem in zip(digests, executor.map(self.check, digests)):
+                if problem is None:
+                    verified.append((time.time(), digest))
+                else:
+                    problems[digest] = problem
+        with self.lock:
+            self.connection.executemany("UPDATE blobs SET verified = ? WHERE digest = ?", verified)
+            self.connection.commit()
+        return problems
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+
+def legacy_image_id(item_id: str, page: int) -> str:
+    # Naming used by SequentialDownloadHandler before the blob store
+    unhashed: str = item_id.strip("/") + "/" + str(page)
+    return hashlib.sha256(unhashed.encode("utf-8")).hexdigest()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["verify", "import", "stats"])
+    parser.add_argument("--root", default="./blobs")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--images", default="./images", help="Legacy download directory to import")
+    parser.add_argument("--dataset", default="./images.sqlite")
+    args = parser.parse_args()
+
+    store = BlobStore(args.root)
+    if args.command == "verify":
+        problems: typing.Dict[str, str] = store.verify(workers=args.workers)
+        for digest, problem in sorted(problems.items()):
+            print(f"{problem}: {store.path(digest)}")
+        print(f"{len(problems)} bad blobs")
+    elif args.command == "import":
+        for _, item_index, page, _ in iter_dataset(args.dataset):
+            item: str = item_index.strip("/")
+            source: str = os.path.join(args.images, legacy_image_id(item, page) + ".jpeg")
+            if os.path.exists(source) and store.lookup(item, page) is None:
+                digest, _ = store.put_file(source)
+                store.link(item, page, digest)
+    print(store.stats())
+    store.close()
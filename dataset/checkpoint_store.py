@@ -0,0 +1,130 @@
+import json
+import sqlite3
+import threading
+import typing
+
+
+class CheckpointStore:
+    path: str
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "collection TEXT NOT NULL, "
+            "item_id TEXT NOT NULL, "
+            "page INTEGER NOT NULL, "
+            "data TEXT NOT NULL, "
+            "PRIMARY KEY (collection, item_id, page))"
+        )
+        self.connection.commit()
+
+    def has_item(self, collection: str, item_id: str) -> bool:
+        with self.lock:
+            cursor = self.connection.execute(
+                "SELECT 1 FROM pages WHERE collection = ? AND item_id = ? LIMIT 1",
+                (collection, item_id),
+            )
+            return cursor.fetchone() is not None
+
+    def has_page(self, collection: str, item_id: str, page: int) -> bool:
+        with self.lock:
+            cursor = self.connection.execute(
+                "SELECT 1 FROM pages WHERE collection = ? AND item_id = ? AND page = ?",
+                (collection, item_id, int(page)),
+            )
+            return cursor.fetchone() is not None
+
+    def put_page(self, collection: str, item_id: str, page: int, data: dict) -> None:
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO pages (collection, item_id, page, data) VALUES (?, ?, ?, ?)",
+                (collection, item_id, int(page), json.dumps(data)),
+            )
+            self.connection.commit()
+
+    def pages(self, collection: str, item_id: str) -> dict:
+        with self.lock:
+            cursor = self.connection.execute(
+                "SELECT page, data FROM pages WHERE collection = ? AND item_id = ?",
+                (collection, item_id),
+            )
+            return {page: json.loads(data) for page, data in cursor.fetchall()}
+
+    def collections(self) -> typing.List[str]:
+        with self.lock:
+            cursor = self.connection.execute("SELECT DISTINCT collection FROM pages")
+            return [row[0] for row in cursor.fetchall()]
+
+    def is_empty(self) -> bool:
+        with self.lock:
+            return self.connection.execute("SELECT 1 FROM pages LIMIT 1").fetchone() is None
+
+    def iter_pages(
+        self, collection: typing.Optional[str] = None
+    ) -> typing.Iterator[typing.Tuple[str, str, int, dict]]:
+        # Separate cursor so iterating does not hold the lock between rows
+        reader = sqlite3.connect(self.path)
+        try:
+            if collection is None:
+                cursor = reader.execute(
+                    "SELECT collection, item_id, page, data FROM pages ORDER BY collection, item_id, page"
+                )
+            else:
+                cursor = reader.execute(
+                    "SELECT collection, item_id, page, data FROM pages WHERE collection = ? ORDER BY item_id, page",
+                    (collection,),
+                )
+            for c_id, item_id, page, data in cursor:
+                yield c_id, item_id, page, json.loads(data)
+        finally:
+            reader.close()
+
+    def import_json(self, path: str) -> int:
+        with open(path, "r") as json_file:
+            collections: dict = json.load(json_file)
+        rows: list = [
+            (c_id, item_id, int(page), json.dumps(data))
+            for c_id, items in collections.items()
+            for item_id, pages in items.items()
+            for page, data in pages.items()
+            if data
+        ]
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO pages (collection, item_id, page, data) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self.connection.commit()
+        return len(rows)
+
+    def export_json(self, path: str) -> None:
+        collections: dict = {}
+        for c_id, item_id, page, data in self.iter_pages():
+            collections.setdefault(c_id, {}).setdefault(item_id, {})[page] = data
+        with open(path, "w") as json_file:
+            json.dump(collections, json_file)
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+
+def iter_dataset(path: str) -> typing.Iterator[typing.Tuple[str, str, int, dict]]:
+    if path.endswith(".json"):
+        with open(path, "r") as json_file:
+            collections: dict = json.load(json_file)
+        for c_id, items in collections.items():
+            for item_id, pages in items.items():
+                for page, data in pages.items():
+                    yield c_id, item_id, int(page), data
+    else:
+        store = CheckpointStore(path)
+        try:
+            yield from store.iter_pages()
+        finally:
+            store.close()
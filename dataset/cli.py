@@ -0,0 +1,314 @@
+import argparse
+import json
+import os
+import sys
+import typing
+
+# Only the standard library is imported up here, every subcommand imports what it needs
+# when it runs, so --help and cron no-ops never pay for requests, mariadb or Pillow
+
+CONFIG_ENVIRONMENT: str = "YEAR_GUESSER_CONFIG"
+DEFAULT_CONFIG: str = "./year_guesser.json"
+PATH_KEYS: typing.Tuple[str, ...] = (
+    "store",
+    "legacy_json",
+    "images",
+    "blobs",
+    "cache",
+    "frontier",
+    "db_config",
+)
+DEFAULTS: dict = {
+    "collections": [],
+    "store": "./images.sqlite",
+    "legacy_json": "./images.json",
+    "images": "./images",
+    "blobs": None,
+    "cache": None,
+    "frontier": None,
+    "db_config": "./db_access.json",
+}
+
+
+def load_config(path: typing.Optional[str]) -> dict:
+    # Relative paths in a config file are relative to that file, not to the working directory
+    config: dict = dict(DEFAULTS)
+    if path is None:
+        path = os.environ.get(CONFIG_ENVIRONMENT, DEFAULT_CONFIG)
+        if not os.path.exists(path):
+            return config
+    with open(path, "r") as config_file:
+        config.update(json.load(config_file))
+    base: str = os.path.dirname(os.path.abspath(path))
+    for key in PATH_KEYS:
+        if config[key] is not None and not os.path.isabs(config[key]):
+            config[key] = os.path.normpath(os.path.join(base, config[key]))
+    return config
+
+
+def option(args: argparse.Namespace, config: dict, key: str):
+    value = getattr(args, key, None)
+    return value if value is not None else config[key]
+
+
+def start_metrics(args: argparse.Namespace):
+    from metrics import metrics
+
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port)
+    if args.metrics_dump is not None:
+        metrics.dump_periodically(args.metrics_dump)
+    return metrics
+
+
+def crawl(args: argparse.Namespace, config: dict) -> None:
+    import logger
+    from checkpoint_store import CheckpointStore
+    from crawl_frontier import CrawlFrontier
+    from crawl_profiler import StackSampler, profiler
+    from http_session import HTTPSession
+    from loc_crawler import ConcurrentCrawler, LOCCrawler
+    from rate_limiter import HostRateLimiter
+    from response_cache import ResponseCache
+
+    logger.configure()
+    c_ids: typing.List[str] = args.collection or config["collections"]
+    if not c_ids:
+        raise SystemExit("No collections configured, add some to the config file or pass --collection")
+    metrics = start_metrics(args)
+    if args.cprofile is not None and args.workers != 1:
+        # Python 3.12 allows a single active cProfile per process
+        print("--cprofile profiles a single worker, crawling with --workers 1")
+        args.workers = 1
+    if args.profile or args.cprofile is not None:
+        profiler.enable(slowest=args.profile_slowest, use_cprofile=args.cprofile is not None)
+    sampler: typing.Optional[StackSampler] = None
+    if args.sample_stacks is not None:
+        sampler = StackSampler(args.sample_interval)
+        sampler.start()
+
+    session = HTTPSession(
+        pool_size=max(args.pool_size, args.workers),
+        rate_limiter=HostRateLimiter(args.rate, args.burst),
+    )
+    cache: typing.Optional[ResponseCache] = None
+    cache_path: typing.Optional[str] = option(args, config, "cache")
+    if cache_path is not None:
+        cache = ResponseCache(
+            cache_path,
+            max_bytes=args.cache_size_mb * 1024**2,
+            ttl=args.cache_ttl if args.cache_ttl >= 0 else None,
+        )
+    crawler = LOCCrawler(session=session, cache=cache)
+    concurrent_crawler = ConcurrentCrawler(crawler, workers=args.workers, page_size=args.page_size)
+    store = CheckpointStore(option(args, config, "store"))
+    legacy_json: str = config["legacy_json"]
+    if store.is_empty() and os.path.exists(legacy_json):
+        print(f"Imported {store.import_json(legacy_json)} pages from {legacy_json}")
+
+    frontier_path: typing.Optional[str] = option(args, config, "frontier")
+    if frontier_path is not None:
+        frontier = CrawlFrontier(frontier_path)
+        if args.retry_failed:
+            print(f"Retrying {frontier.retry_failed()} failed units")
+        concurrent_crawler.crawl_frontier(c_ids, frontier, store)
+        frontier.close()
+    else:
+        for c_id in c_ids:
+            concurrent_crawler.crawl_collection(c_id, store)
+    store.close()
+    if profiler.enabled:
+        profiler.print_report()
+        if args.profile_json is not None:
+            profiler.dump(args.profile_json)
+    if args.cprofile is not None:
+        profiler.dump_cprofile(args.cprofile)
+    if sampler is not None:
+        sampler.stop()
+        sampler.dump(args.sample_stacks)
+    if cache is not None:
+        print(f"Response cache: {cache.info()}")
+        cache.close()
+    if args.metrics_dump is not None:
+        metrics.dump(args.metrics_dump)
+
+
+def download(args: argparse.Namespace, config: dict) -> None:
+    from blob_store import BlobStore
+    from downloader import ConcurrentDownloadHandler, SequentialDownloadHandler
+
+    metrics = start_metrics(args)
+    store: str = option(args, config, "store")
+    images: str = option(args, config, "images")
+    blob_store: typing.Optional[BlobStore] = None
+    blobs: typing.Optional[str] = option(args, config, "blobs")
+    if blobs is not None:
+        blob_store = BlobStore(blobs)
+    if args.workers > 1:
+        handler = ConcurrentDownloadHandler(
+            store,
+            save_path=images,
+            blob_store=blob_store,
+            workers=args.workers,
+            per_host=args.per_host,
+        )
+    else:
+        handler = SequentialDownloadHandler(store, save_path=images, blob_store=blob_store)
+    handler.download_all()
+    if args.metrics_dump is not None:
+        metrics.dump(args.metrics_dump)
+
+
+def ingest(args: argparse.Namespace, config: dict) -> None:
+    sys.path.insert(
+        0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "web", "flask-backend")
+    )
+    from ingest_pipeline import IngestPipeline
+
+    handler = None
+    if not args.dry_run:
+        from db_handler import DBHandler
+
+        handler = DBHandler(option(args, config, "db_config"), pool_size=args.writers + 1)
+    stats: typing.Dict[str, dict] = IngestPipeline(
+        handler,
+        writers=args.writers,
+        batch_size=args.batch_size,
+        progress_interval=args.progress_interval,
+    ).run(option(args, config, "store"))
+    if stats["write"]["failed"]:
+        raise SystemExit(f"{stats['write']['failed']} pages could not be written")
+
+
+def verify(args: argparse.Namespace, config: dict) -> None:
+    # Every crawled page should have its image, either as a blob or in the legacy directory
+    from checkpoint_store import iter_dataset
+
+    store: str = option(args, config, "store")
+    blobs: typing.Optional[str] = option(args, config, "blobs")
+    images: str = option(args, config, "images")
+    if not os.path.exists(store):
+        raise SystemExit(f"No crawl output at {store}")
+
+    blob_store = None
+    if blobs is not None:
+        from blob_store import BlobStore
+
+        blob_store = BlobStore(blobs)
+    else:
+        from blob_store import legacy_image_id
+
+    pages: int = 0
+    missing: int = 0
+    for _, item_index, page, _ in iter_dataset(store):
+        pages += 1
+        item: str = item_index.strip("/")
+        if blob_store is not None:
+            found: bool = blob_store.lookup(item, page) is not None
+        else:
+            found = os.path.exists(os.path.join(images, legacy_image_id(item, page) + ".jpeg"))
+        if not found:
+            missing += 1
+            if args.verbose:
+                print(f"Missing image for {item} - {page}")
+    print(f"{pages} pages, {missing} without an image")
+
+    problems: int = 0
+    if blob_store is not None and not args.skip_blobs:
+        bad: typing.Dict[str, str] = blob_store.verify(workers=args.workers)
+        for digest, problem in sorted(bad.items()):
+            print(f"{problem}: {blob_store.path(digest)}")
+        problems = len(bad)
+        print(f"{problems} bad blobs")
+        blob_store.close()
+    if missing or problems:
+        raise SystemExit(1)
+
+
+def add_metrics_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--metrics-port", type=int, default=None)
+    parser.add_argument("--metrics-dump", default=None, help="JSON file rewritten every 10 seconds")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="year_guesser", description="Year Guesser dataset tools")
+    parser.add_argument(
+        "--config",
+        default=None,
+        help=f"JSON config, defaults to ${CONFIG_ENVIRONMENT} or {DEFAULT_CONFIG} if present",
+    )
+    parser.add_argument("--print-config", action="store_true", help="Print the resolved config and exit")
+    subparsers = parser.add_subparsers(dest="command")
+
+    crawl_parser = subparsers.add_parser("crawl", help="Crawl collections into the checkpoint store")
+    crawl_parser.add_argument("--collection", action="append", help="Crawl only this collection, repeatable")
+    crawl_parser.add_argument("--workers", type=int, default=4)
+    crawl_parser.add_argument("--rate", type=float, default=3.0, help="Requests per second and host")
+    crawl_parser.add_argument("--burst", type=float, default=10.0)
+    crawl_parser.add_argument("--pool-size", type=int, default=10)
+    crawl_parser.add_argument("--store", default=None)
+    crawl_parser.add_argument("--page-size", type=int, default=100, help="Items per collection listing page")
+    crawl_parser.add_argument(
+        "--frontier",
+        default=None,
+        help="Persistent job queue, shared by every crawler process pointed at it",
+    )
+    crawl_parser.add_argument("--retry-failed", action="store_true")
+    crawl_parser.add_argument("--cache", default=None, help="Directory for cached API responses")
+    crawl_parser.add_argument("--cache-size-mb", type=int, default=1024)
+    crawl_parser.add_argument(
+        "--cache-ttl", type=float, default=7 * 24 * 3600, help="Seconds, negative never expires"
+    )
+    add_metrics_arguments(crawl_parser)
+    crawl_parser.add_argument("--profile", action="store_true", help="Time each crawl phase per item")
+    crawl_parser.add_argument("--profile-slowest", type=int, default=20, help="Slowest items to report")
+    crawl_parser.add_argument("--profile-json", default=None, help="Also write the phase report here")
+    crawl_parser.add_argument("--cprofile", default=None, help="pstats file of the item processing")
+    crawl_parser.add_argument("--sample-stacks", default=None, help="Folded stack samples for flame graphs")
+    crawl_parser.add_argument("--sample-interval", type=float, default=0.005)
+    crawl_parser.set_defaults(run=crawl)
+
+    download_parser = subparsers.add_parser("download", help="Download the images of crawled pages")
+    download_parser.add_argument("--workers", type=int, default=1)
+    download_parser.add_argument("--per-host", type=int, default=4)
+    download_parser.add_argument("--store", default=None)
+    download_parser.add_argument("--images", default=None)
+    download_parser.add_argument("--blobs", default=None, help="Content-addressed store instead of --images")
+    add_metrics_arguments(download_parser)
+    download_parser.set_defaults(run=download)
+
+    ingest_parser = subparsers.add_parser("ingest", help="Load crawled pages into the database")
+    ingest_parser.add_argument("--store", default=None)
+    ingest_parser.add_argument("--db-config", default=None)
+    ingest_parser.add_argument("--writers", type=int, default=4)
+    ingest_parser.add_argument("--batch-size", type=int, default=500)
+    ingest_parser.add_argument("--progress-interval", type=float, default=2.0)
+    ingest_parser.add_argument("--dry-run", action="store_true", help="Parse and transform only")
+    ingest_parser.set_defaults(run=ingest)
+
+    verify_parser = subparsers.add_parser("verify", help="Check that every crawled page has an intact image")
+    verify_parser.add_argument("--store", default=None)
+    verify_parser.add_argument("--images", default=None)
+    verify_parser.add_argument("--blobs", default=None)
+    verify_parser.add_argument("--workers", type=int, default=8)
+    verify_parser.add_argument("--skip-blobs", action="store_true", help="Skip rehashing blob contents")
+    verify_parser.add_argument("--verbose", action="store_true")
+    verify_parser.set_defaults(run=verify)
+    return parser
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> None:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    config: dict = load_config(args.config)
+    if args.print_config:
+        print(json.dumps(config, indent=4))
+        return
+    if args.command is None:
+        parser.print_help()
+        return
+    args.run(args, config)
+
+
+if __name__ == "__main__":
+    main()
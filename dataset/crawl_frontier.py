@@ -0,0 +1,141 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+import typing
+
+
+class FrontierUnit(typing.NamedTuple):
+    id: int
+    kind: str
+    collection: str
+    target: str
+    page: int
+    attempts: int
+
+
+class CrawlFrontier:
+    # Kinds of work: a collection listing page, an item's first page, another page of an item
+    COLLECTION_PAGE: str = "collection_page"
+    ITEM: str = "item"
+    PAGE: str = "page"
+
+    path: str
+    max_attempts: int
+    lease: float
+
+    def __init__(self, path: str, max_attempts: int = 3, lease: float = 300.0) -> None:
+        self.path = path
+        self.max_attempts = max_attempts
+        # In-flight units whose lease ran out (crashed worker) are handed out again
+        self.lease = lease
+        self.worker: str = f"{socket.gethostname()}:{os.getpid()}"
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            path, timeout=30.0, isolation_level=None, check_same_thread=False
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS units ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "kind TEXT NOT NULL, "
+            "collection TEXT NOT NULL, "
+            "target TEXT NOT NULL, "
+            "page INTEGER NOT NULL DEFAULT 0, "
+            "state TEXT NOT NULL DEFAULT 'pending', "
+            "attempts INTEGER NOT NULL DEFAULT 0, "
+            "worker TEXT, "
+            "lease_until REAL, "
+            "error TEXT, "
+            "UNIQUE (kind, collection, target, page))"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS units_state ON units (state, lease_until)"
+        )
+
+    def add(self, kind: str, collection: str, target: str, page: int = 0) -> bool:
+        with self.lock:
+            cursor = self.connection.execute(
+                "INSERT OR IGNORE INTO units (kind, collection, target, page) VALUES (?, ?, ?, ?)",
+                (kind, collection, target, page),
+            )
+            return cursor.rowcount > 0
+
+    def add_many(self, units: typing.Iterable[typing.Tuple[str, str, str, int]]) -> None:
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                self.connection.executemany(
+                    "INSERT OR IGNORE INTO units (kind, collection, target, page) VALUES (?, ?, ?, ?)",
+                    units,
+                )
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+
+    def claim(self) -> typing.Optional[FrontierUnit]:
+        with self.lock:
+            now: float = time.time()
+            # IMMEDIATE takes the write lock up front, so two processes never claim the same unit
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.connection.execute(
+                    "SELECT id, kind, collection, target, page, attempts FROM units "
+                    "WHERE state = 'pending' OR (state = 'in_flight' AND lease_until < ?) "
+                    "ORDER BY id LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is not None:
+                    self.connection.execute(
+                        "UPDATE units SET state = 'in_flight', worker = ?, lease_until = ? WHERE id = ?",
+                        (self.worker, now + self.lease, row[0]),
+                    )
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return FrontierUnit(*row)
+
+    def done(self, unit: FrontierUnit) -> None:
+        with self.lock:
+            self.connection.execute(
+                "UPDATE units SET state = 'done', lease_until = NULL, error = NULL WHERE id = ?",
+                (unit.id,),
+            )
+
+    def fail(self, unit: FrontierUnit, error: str) -> None:
+        state: str = "failed" if unit.attempts + 1 >= self.max_attempts else "pending"
+        with self.lock:
+            self.connection.execute(
+                "UPDATE units SET state = ?, attempts = attempts + 1, lease_until = NULL, error = ? WHERE id = ?",
+                (state, error, unit.id),
+            )
+
+    def retry_failed(self) -> int:
+        with self.lock:
+            cursor = self.connection.execute(
+                "UPDATE units SET state = 'pending', attempts = 0 WHERE state = 'failed'"
+            )
+            return cursor.rowcount
+
+    def active(self) -> int:
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM units WHERE state IN ('pending', 'in_flight')"
+            ).fetchone()[0]
+
+    def counts(self) -> typing.Dict[str, int]:
+        with self.lock:
+            return dict(
+                self.connection.execute(
+                    "SELECT state, COUNT(*) FROM units GROUP BY state"
+                ).fetchall()
+            )
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,231 @@
+import array
+import cProfile
+import collections
+import contextlib
+import functools
+import heapq
+import json
+import pstats
+import sys
+import threading
+import time
+import traceback
+import typing
+
+# Shared so phase() costs next to nothing while profiling is off
+DISABLED = contextlib.nullcontext()
+
+
+def percentile(ordered: typing.Sequence[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class StackSampler:
+    # Samples every thread's stack on an interval, dumped in folded format for flame graphs
+    def __init__(self, interval: float = 0.005) -> None:
+        self.interval = interval
+        self.stacks: typing.Counter[str] = collections.Counter()
+        self.stopped = threading.Event()
+        self.thread: typing.Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self.run, name="stack-sampler", daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        own: int = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack: str = ";".join(
+                    f"{summary.name} ({summary.filename.rsplit('/', 1)[-1]}:{summary.lineno})"
+                    for summary in traceback.extract_stack(frame)
+                )
+                self.stacks[stack] += 1
+
+    def stop(self) -> None:
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def dump(self, path: str) -> None:
+        with open(path, "w") as output:
+            for stack, count in self.stacks.most_common():
+                output.write(f"{stack} {count}\n")
+
+
+class CrawlProfiler:
+    # Phases nest, e.g. largest_image includes image_options for LOCResource, and
+    # every phase of an item is part of its total
+    def __init__(self) -> None:
+        self.enabled = False
+        self.slowest_count = 20
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.timings: typing.Dict[str, array.array] = {}
+        self.slowest: typing.List[tuple] = []
+        self.profiles: typing.List[cProfile.Profile] = []
+        self.use_cprofile = False
+
+    def enable(self, slowest: int = 20, use_cprofile: bool = False) -> None:
+        self.slowest_count = slowest
+        self.use_cprofile = use_cprofile
+        self.enabled = True
+
+    def phase(self, name: str) -> typing.ContextManager:
+        if not self.enabled:
+            return DISABLED
+        return self.timed(name)
+
+    def phased(self, name: str) -> typing.Callable:
+        # Decorator form of phase() for whole methods
+        def decorator(function: typing.Callable) -> typing.Callable:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with self.timed(name):
+                    return function(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    @contextlib.contextmanager
+    def timed(self, name: str) -> typing.Iterator[None]:
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed: float = time.perf_counter() - start
+            current: typing.Optional[dict] = getattr(self.local, "current", None)
+            if current is not None:
+                current["phases"][name] = current["phases"].get(name, 0.0) + elapsed
+            else:
+                # E.g. collection listings, kept apart from the per-item percentiles
+                self.add(f"{name} (no item)", elapsed)
+
+    def add(self, name: str, elapsed: float) -> None:
+        with self.lock:
+            if name not in self.timings:
+                self.timings[name] = array.array("d")
+            self.timings[name].append(elapsed)
+
+    def cprofile(self) -> typing.Optional[cProfile.Profile]:
+        # Enables this thread's profile, cProfile only sees the thread it is enabled on so each
+        # worker gets its own. From Python 3.12 only one can be active per process, the CLI
+        # crawls with one worker then. None if another profiler is active
+        profile: typing.Optional[cProfile.Profile] = getattr(self.local, "profile", None)
+        fresh: bool = profile is None
+        if fresh:
+            profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as ex:
+            # Profiling must never fail the fetch itself
+            print(f"cProfile disabled: {ex}")
+            self.use_cprofile = False
+            return None
+        if fresh:
+            self.local.profile = profile
+            with self.lock:
+                self.profiles.append(profile)
+        return profile
+
+    @contextlib.contextmanager
+    def item(self, item_id: str, page: typing.Optional[int]) -> typing.Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        current: dict = {"item_id": item_id, "page": page, "phases": {}}
+        self.local.current = current
+        profile: typing.Optional[cProfile.Profile] = self.cprofile() if self.use_cprofile else None
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                try:
+                    profile.disable()
+                except ValueError:
+                    pass
+            total: float = time.perf_counter() - start
+            self.local.current = None
+            current["phases"]["total"] = total
+            for name, elapsed in current["phases"].items():
+                self.add(name, elapsed)
+            entry: tuple = (total, id(current), current)
+            with self.lock:
+                if len(self.slowest) < self.slowest_count:
+                    heapq.heappush(self.slowest, entry)
+                elif total > self.slowest[0][0]:
+                    heapq.heapreplace(self.slowest, entry)
+
+    def annotate(self, **details) -> None:
+        # Attaches e.g. date_raw and page counts to the item being timed on this thread
+        current: typing.Optional[dict] = getattr(self.local, "current", None) if self.enabled else None
+        if current is not None:
+            current.update(details)
+
+    def report(self) -> dict:
+        with self.lock:
+            timings: dict = {name: sorted(values) for name, values in self.timings.items()}
+            slowest: list = [entry[2] for entry in sorted(self.slowest, reverse=True)]
+        total_time: float = sum(timings.get("total", ()))
+        phases: dict = {}
+        for name, ordered in sorted(timings.items(), key=lambda pair: -sum(pair[1])):
+            phases[name] = {
+                "count": len(ordered),
+                "seconds": sum(ordered),
+                "share": sum(ordered) / total_time if total_time else 0.0,
+                "p50": percentile(ordered, 0.5),
+                "p90": percentile(ordered, 0.9),
+                "p99": percentile(ordered, 0.99),
+                "max": ordered[-1],
+            }
+        return {"phases": phases, "slowest": slowest}
+
+    def print_report(self) -> None:
+        report: dict = self.report()
+        print(
+            f"{'phase':<26} {'count':>8} {'seconds':>9} {'share':>6} "
+            f"{'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+        )
+        for name, stats in report["phases"].items():
+            print(
+                f"{name:<26} {stats['count']:>8} {stats['seconds']:>9.2f} {stats['share']:>6.1%} "
+                f"{stats['p50'] * 1000:>8.2f} {stats['p90'] * 1000:>8.2f} "
+                f"{stats['p99'] * 1000:>8.2f} {stats['max'] * 1000:>8.2f}"
+            )
+        print("Slowest items:")
+        for item in report["slowest"]:
+            phases: dict = item["phases"]
+            breakdown: str = ", ".join(
+                f"{name} {seconds * 1000:.1f}"
+                for name, seconds in sorted(phases.items(), key=lambda pair: -pair[1])
+                if name != "total"
+            )
+            print(
+                f"{phases['total'] * 1000:8.1f} ms {item['item_id']} page {item['page']} "
+                f"({item.get('pages')} pages, date_raw {item.get('date_raw')!r}): {breakdown}"
+            )
+
+    def dump(self, path: str) -> None:
+        with open(path, "w") as output:
+            json.dump(self.report(), output, indent=4)
+
+    def dump_cprofile(self, path: str) -> None:
+        with self.lock:
+            profiles: list = list(self.profiles)
+        if not profiles:
+            return
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(path)
+
+
+profiler = CrawlProfiler()
@@ -0,0 +1,184 @@
+import collections
+import datetime
+import logging
+import re
+import threading
+import typing
+
+from metrics import metrics
+
+
+DATE_FORMATS: typing.List[str] = [
+    "%Y-%m-%d",
+    "%d. %m. %Y",
+    "%d-%m-%Y",
+    "%d %B %Y",
+    "%d. %B %Y",
+    "%d. %b. %Y",
+    "%d %b %Y",
+    "%Y %B %d",
+    "%Y %B %d.",
+    "%Y %b. %d.",
+    "%Y %b %d",
+    "%m %Y",
+    "%m. %Y",
+    "%B %Y",
+    "%B. %Y",
+    "%B-%Y",
+    "%b %Y",
+    "%b. %Y",
+    "%b-%Y",
+    "%Y-%m",
+    "%Y %m",
+    "%Y-%B",
+    "%Y %B",
+    "%Y %B.",
+    "%Y-%b",
+    "%Y %b",
+    "%Y %b.",
+    "%Y",
+    "c%Y.",
+]
+
+MONTH_NAMES: typing.List[str] = [
+    "january",
+    "february",
+    "march",
+    "april",
+    "may",
+    "june",
+    "july",
+    "august",
+    "september",
+    "october",
+    "november",
+    "december",
+]
+MONTH_ABBREVIATIONS: typing.List[str] = [name[:3] for name in MONTH_NAMES]
+
+# Same alternatives strptime uses for these directives (English month names)
+DIRECTIVES: typing.Dict[str, str] = {
+    "Y": r"(?P<Y>\d\d\d\d)",
+    "m": r"(?P<m>1[0-2]|0[1-9]|[1-9])",
+    "d": r"(?P<d>3[01]|[12]\d|0[1-9]|[1-9]| [1-9])",
+    "B": "(?P<B>" + "|".join(MONTH_NAMES) + ")",
+    "b": "(?P<b>" + "|".join(MONTH_ABBREVIATIONS) + ")",
+}
+
+STRIP_NON_DIGITS = re.compile(r"^\D*(.*?)\D*$")
+
+
+def compile_format(date_format: str) -> typing.Pattern:
+    pattern: str = ""
+    for literal, directive in re.findall(r"([^%]*)(?:%(.))?", date_format):
+        pattern += re.sub(r"\\\s+", r"\\s+", re.escape(literal))
+        if directive:
+            pattern += DIRECTIVES[directive]
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def build_date(match: typing.Match) -> datetime.datetime:
+    groups: dict = match.groupdict()
+    month: int = 1
+    if "m" in groups:
+        month = int(groups["m"])
+    elif "B" in groups:
+        month = MONTH_NAMES.index(groups["B"].lower()) + 1
+    elif "b" in groups:
+        month = MONTH_ABBREVIATIONS.index(groups["b"].lower()) + 1
+    return datetime.datetime(int(groups["Y"]), month, int(groups.get("d") or 1))
+
+
+class DateParser:
+    formats: typing.List[str]
+    cache_size: int
+    logger: logging.Logger = logging.getLogger(__name__)
+
+    def __init__(
+        self, formats: typing.List[str] = DATE_FORMATS, cache_size: int = 4096
+    ) -> None:
+        self.formats = list(formats)
+        self.cache_size = cache_size
+        self.patterns: typing.List[typing.Pattern] = [
+            compile_format(date_format) for date_format in self.formats
+        ]
+        # Indices into formats, most frequently matching first. Replaced, never
+        # modified in place, so a scan can iterate the list it started with
+        self.order: typing.List[int] = list(range(len(self.formats)))
+        self.hits: typing.List[int] = [0] * len(self.formats)
+        self.cache: collections.OrderedDict = collections.OrderedDict()
+        self.cache_hits: int = 0
+        self.cache_misses: int = 0
+        self.lock = threading.Lock()
+
+    def match(self, date_string: str) -> typing.Optional[datetime.datetime]:
+        order: typing.List[int] = self.order
+        for position, index in enumerate(order):
+            match = self.patterns[index].fullmatch(date_string)
+            if match is None:
+                continue
+            try:
+                date: datetime.datetime = build_date(match)
+            except ValueError:
+                # e.g. "1920-02-30", strptime rejects those as well
+                continue
+            with self.lock:
+                self.hits[index] += 1
+                # Another thread may have reordered since our snapshot, find it again
+                if self.order is not order:
+                    position = self.order.index(index)
+                if position and self.hits[index] > self.hits[self.order[position - 1]]:
+                    reordered: typing.List[int] = list(self.order)
+                    reordered[position - 1], reordered[position] = index, reordered[position - 1]
+                    self.order = reordered
+            return date
+        return None
+
+    def parse_uncached(self, date_raw: str) -> typing.Optional[datetime.datetime]:
+        # The formats are mutually exclusive, so the order they are tried in
+        # does not change the result
+        date = self.match(date_raw)
+        if date is None:
+            self.logger.warning(f'Processing date string "{date_raw}"')
+            date = self.match(STRIP_NON_DIGITS.sub(r"\1", date_raw))
+        return date
+
+    def parse(self, date_raw: typing.Any) -> datetime.datetime:
+        date_raw = str(date_raw)
+        with self.lock:
+            cached: bool = date_raw in self.cache
+            if cached:
+                self.cache.move_to_end(date_raw)
+                date = self.cache[date_raw]
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+        if not cached:
+            metrics.inc("date_parse_cache_misses_total")
+            date = self.parse_uncached(date_raw)
+            with self.lock:
+                self.cache[date_raw] = date
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+
+        if date is None:
+            metrics.inc("date_parse_failures_total")
+            raise ValueError(f'Could not parse "{date_raw}" as a datetime')
+        return date
+
+    def format_hits(self) -> typing.Dict[str, int]:
+        with self.lock:
+            return {self.formats[index]: self.hits[index] for index in self.order}
+
+    def cache_info(self) -> typing.Dict[str, int]:
+        with self.lock:
+            return {
+                "hits": self.cache_hits,
+                "misses": self.cache_misses,
+                "size": len(self.cache),
+                "max_size": self.cache_size,
+            }
+
+
+date_parser = DateParser()
@@ -0,0 +1,74 @@
+import argparse
+import datetime
+import logging
+import re
+import time
+import typing
+
+from checkpoint_store import iter_dataset
+from date_parser import DATE_FORMATS, DateParser
+
+
+def strptime_parse(date_entry: str) -> datetime.datetime:
+    # The trial-and-error loop LOCResource.date used before DateParser
+    date = None
+    for date_string in [date_entry, re.sub(r"^\D*(.*?)\D*$", r"\1", date_entry)]:
+        for date_format in DATE_FORMATS:
+            try:
+                date = datetime.datetime.strptime(date_string, date_format)
+                break
+            except ValueError:
+                pass
+        if date is not None:
+            break
+    if date is None:
+        raise ValueError(f'Could not parse "{date_entry}" as a datetime')
+    return date
+
+
+def run(parse: typing.Callable, values: typing.List[str]) -> typing.Tuple[float, list]:
+    results: list = []
+    start: float = time.perf_counter()
+    for value in values:
+        try:
+            results.append(parse(value))
+        except ValueError:
+            results.append(None)
+    return time.perf_counter() - start, results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dataset", help="Checkpoint store or images.json of a crawl")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    logging.getLogger("date_parser").setLevel(logging.ERROR)
+
+    values: typing.List[str] = [
+        str(entry["date_raw"]) for _, _, _, entry in iter_dataset(args.dataset)
+    ]
+    print(f"{len(values)} date_raw values, {len(set(values))} distinct")
+
+    legacy_time, legacy_results = run(strptime_parse, values)
+    print(f"strptime loop: {legacy_time:.3f}s ({len(values) / legacy_time:.0f}/s)")
+
+    uncached = DateParser(cache_size=0)
+    uncached_time, uncached_results = run(uncached.parse, values)
+    print(f"DateParser (no cache): {uncached_time:.3f}s ({len(values) / uncached_time:.0f}/s)")
+
+    cached = DateParser()
+    for repeat in range(args.repeat):
+        cached_time, cached_results = run(cached.parse, values)
+        print(f"DateParser (pass {repeat + 1}): {cached_time:.3f}s ({len(values) / cached_time:.0f}/s)")
+
+    mismatches: list = [
+        value
+        for value, legacy, new in zip(values, legacy_results, uncached_results)
+        if legacy != new
+    ]
+    print(f"Mismatches against strptime: {len(mismatches)}")
+    for value in mismatches[:20]:
+        print(f'  "{value}"')
+    print(f"Cache: {cached.cache_info()}")
+    for date_format, hits in cached.format_hits().items():
+        print(f"  {date_format!r}: {hits}")
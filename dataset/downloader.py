@@ -1,42 +1,176 @@
-import requests
 import hashlib
-import json
 import os
 import time
+import typing
+import tempfile
+import threading
+import concurrent.futures
+import urllib.parse
+
+from http_session import HTTPSession
+from checkpoint_store import iter_dataset
+from blob_store import BlobStore
+from metrics import metrics
 
 class SequentialDownloadHandler:
     save_path: str
-    dataset: dict
+    dataset_path: str
+    session: HTTPSession
+    blob_store: typing.Optional[BlobStore]
+    chunk_size: int = 64 * 1024
 
-    def __init__(self, dataset_path: str, save_path: str = "./images") -> None:
+    def __init__(
+        self,
+        dataset_path: str,
+        save_path: str = "./images",
+        session: typing.Optional[HTTPSession] = None,
+        blob_store: typing.Optional[BlobStore] = None,
+    ) -> None:
         self.save_path = save_path
+        self.blob_store = blob_store
+        self.session = session if session is not None else HTTPSession()
         self.hasher = hashlib.sha256
 
-        with open(dataset_path, "r") as dataset_file:
-            self.dataset = json.load(dataset_file)
+        self.dataset_path = dataset_path
+
+    def jobs(self) -> typing.Iterator[typing.Tuple[str, int, str]]:
+        for collection, item_index, page, entry in iter_dataset(self.dataset_path):
+            item = item_index.strip("/")
+            url: str = entry["jpeg"]["url"]
+            yield item, page, url
 
-        for collection in self.dataset:
-            for item_index in self.dataset[collection]:
-                item = item_index.strip("/")
-                for page_index in self.dataset[collection][item_index]:
-                    page = int(page_index)
-                    url: str = self.dataset[collection][item_index][page_index]["jpeg"]["url"]
-                    self.download(item, page, url)
-                    time.sleep(0.01)
+    def download_all(self):
+        for item, page, url in self.jobs():
+            # Already counted as failed, one bad image must not end the whole run
+            try:
+                self.download(item, page, url)
+            except Exception as ex:
+                print(f"Exception occured: {ex}")
+            time.sleep(0.01)
 
     def download(self, id: str, page: int, url: str):
+        if self.blob_store is not None:
+            return self.download_blob(id, page, url)
         output_path: str = os.path.join(self.save_path, self.get_id(id, page) + ".jpeg")
         if os.path.exists(output_path):
+            metrics.inc("downloads_total", result="skipped")
             print(f"Skipping {output_path}")
             return
-        req = requests.get(url)
-        with open(output_path, "wb") as output_file:
-            output_file.write(req.content)
+        start: float = time.perf_counter()
+        req = None
+        try:
+            req = self.session.get(url, stream=True)
+            if not req.ok:
+                raise ValueError(f"Request failed: {req.status_code}")
+            # Only complete files ever appear under output_path
+            file_descriptor, temp_path = tempfile.mkstemp(
+                dir=self.save_path, suffix=".part"
+            )
+            try:
+                with os.fdopen(file_descriptor, "wb") as output_file:
+                    for chunk in req.iter_content(chunk_size=self.chunk_size):
+                        output_file.write(chunk)
+                        metrics.inc("download_bytes_total", len(chunk))
+                os.replace(temp_path, output_path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+        except Exception:
+            metrics.inc("downloads_total", result="failed")
+            raise
+        finally:
+            if req is not None:
+                req.close()
+        metrics.inc("downloads_total", result="downloaded")
+        metrics.observe("download_seconds", time.perf_counter() - start)
         print(output_path)
 
+    def download_blob(self, id: str, page: int, url: str):
+        if self.blob_store.lookup(id, page) is not None:
+            metrics.inc("downloads_total", result="skipped")
+            print(f"Skipping {id}/{page}")
+            return
+        start: float = time.perf_counter()
+        req = None
+        try:
+            req = self.session.get(url, stream=True)
+            if not req.ok:
+                raise ValueError(f"Request failed: {req.status_code}")
+            digest, size = self.blob_store.put_stream(req.iter_content(chunk_size=self.chunk_size))
+        except Exception:
+            metrics.inc("downloads_total", result="failed")
+            raise
+        finally:
+            if req is not None:
+                req.close()
+        metrics.inc("download_bytes_total", size)
+        metrics.inc("downloads_total", result="downloaded")
+        metrics.observe("download_seconds", time.perf_counter() - start)
+        self.blob_store.link(id, page, digest)
+        print(self.blob_store.path(digest))
+
     def get_id(self, id: str, page: int):
         unhashed: str = id.strip("/") + "/" + str(page)
         return self.hasher(unhashed.encode("utf-8")).hexdigest()
+
+
+class ConcurrentDownloadHandler(SequentialDownloadHandler):
+    workers: int
+    per_host: int
+
+    def __init__(
+        self,
+        dataset_path: str,
+        save_path: str = "./images",
+        session: typing.Optional[HTTPSession] = None,
+        blob_store: typing.Optional[BlobStore] = None,
+        workers: int = 8,
+        per_host: int = 4,
+    ) -> None:
+        if session is None:
+            session = HTTPSession(pool_size=workers)
+        super().__init__(
+            dataset_path, save_path=save_path, session=session, blob_store=blob_store
+        )
+        self.workers = workers
+        self.per_host = per_host
+        self.host_slots: typing.Dict[str, threading.BoundedSemaphore] = {}
+        self.lock = threading.Lock()
+
+    def host_slot(self, url: str) -> threading.BoundedSemaphore:
+        host: str = urllib.parse.urlparse(url).netloc
+        with self.lock:
+            if host not in self.host_slots:
+                self.host_slots[host] = threading.BoundedSemaphore(self.per_host)
+            return self.host_slots[host]
+
+    def download(self, id: str, page: int, url: str):
+        with self.host_slot(url):
+            super().download(id, page, url)
+
+    def download_all(self):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending: set = set()
+            for item, page, url in self.jobs():
+                # Bounds memory for large datasets instead of queueing every job
+                if len(pending) >= self.workers * 4:
+                    done, pending = concurrent.futures.wait(
+                        pending, return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                    self.report(done)
+                pending.add(executor.submit(self.download, item, page, url))
+            self.report(concurrent.futures.wait(pending).done)
+
+    def report(self, futures: typing.Iterable[concurrent.futures.Future]):
+        for future in futures:
+            if future.exception() is not None:
+                print(f"Exception occured: {future.exception()}")
+
     
 if __name__ == "__main__":
-    sdh = SequentialDownloadHandler("./images.json")
\ No newline at end of file
+    import sys
+
+    import cli
+
+    # Kept for existing cron lines, same as "cli.py download"
+    cli.main(["download"] + sys.argv[1:])
@@ -0,0 +1,134 @@
+import email.utils
+import logging
+import random
+import threading
+import time
+import typing
+import urllib.parse
+
+import requests
+import requests.adapters
+
+from rate_limiter import HostRateLimiter
+from metrics import metrics
+
+
+class HTTPSession:
+    pool_size: int
+    retries: int
+    backoff_base: float
+    backoff_max: float
+    timeout: typing.Tuple[float, float]
+    retry_statuses: typing.Tuple[int, ...]
+    rate_limiter: typing.Optional[HostRateLimiter]
+    logger: logging.Logger = logging.getLogger(__name__)
+
+    def __init__(
+        self,
+        pool_size: int = 10,
+        retries: int = 2,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        timeout: typing.Tuple[float, float] = (5.0, 30.0),
+        retry_statuses: typing.Tuple[int, ...] = (429, 503),
+        rate_limiter: typing.Optional[HostRateLimiter] = None,
+    ) -> None:
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.retry_statuses = retry_statuses
+        self.rate_limiter = rate_limiter
+        # The adapter owns the connection pools and is safe to share, sessions are not
+        self.adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size
+        )
+        self.local = threading.local()
+
+    def session(self) -> requests.Session:
+        if not hasattr(self.local, "session"):
+            session = requests.Session()
+            session.mount("https://", self.adapter)
+            session.mount("http://", self.adapter)
+            self.local.session = session
+        return self.local.session
+
+    def retry_after(self, response: requests.Response) -> typing.Optional[float]:
+        value: typing.Optional[str] = response.headers.get("Retry-After")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            date = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, date.timestamp() - time.time())
+
+    def backoff(
+        self, attempt: int, response: typing.Optional[requests.Response] = None
+    ) -> float:
+        if response is not None:
+            delay: typing.Optional[float] = self.retry_after(response)
+            if delay is not None:
+                return min(delay, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def get(
+        self,
+        url: str,
+        params: typing.Optional[dict] = None,
+        headers: typing.Optional[dict] = None,
+        stream: bool = False,
+        retries: typing.Optional[int] = None,
+        timeout: typing.Optional[typing.Union[float, tuple]] = None,
+    ) -> requests.Response:
+        if retries is None:
+            retries = self.retries
+        # Always at least the one attempt, a negative count would return without a response
+        retries = max(retries, 0)
+        if timeout is None:
+            timeout = self.timeout
+
+        host: str = urllib.parse.urlparse(url).netloc
+        for attempt in range(retries + 1):
+            if self.rate_limiter is not None:
+                waited: float = self.rate_limiter.acquire(url)
+                metrics.inc("http_rate_limit_wait_seconds_total", waited, host=host)
+            start: float = time.perf_counter()
+            try:
+                req = self.session().get(
+                    url, params=params, headers=headers, stream=stream, timeout=timeout
+                )
+            except (requests.ConnectionError, requests.Timeout) as ex:
+                metrics.inc("http_requests_total", host=host, status=type(ex).__name__)
+                if attempt == retries:
+                    raise
+                delay: float = self.backoff(attempt)
+                metrics.inc("http_retries_total", host=host, reason=type(ex).__name__)
+                metrics.inc("http_backoff_seconds_total", delay, host=host, reason=type(ex).__name__)
+                self.logger.warning(f"{ex} on retry {attempt}. Retrying in {delay:.1f} seconds")
+                time.sleep(delay)
+                continue
+
+            metrics.inc("http_requests_total", host=host, status=req.status_code)
+            metrics.observe("http_request_seconds", time.perf_counter() - start, host=host)
+            if req.status_code in self.retry_statuses and attempt != retries:
+                delay = self.backoff(attempt, req)
+                metrics.inc("http_retries_total", host=host, reason=req.status_code)
+                metrics.inc("http_backoff_seconds_total", delay, host=host, reason=req.status_code)
+                self.logger.warning(
+                    f"Received status {req.status_code} on retry {attempt}. Retrying in {delay:.1f} seconds"
+                )
+                req.close()
+                if self.rate_limiter is not None:
+                    # Holds back every worker sharing this host, not just this one
+                    self.rate_limiter.pause(url, delay)
+                else:
+                    time.sleep(delay)
+                continue
+            return req
+        return req
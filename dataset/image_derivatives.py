@@ -0,0 +1,127 @@
+import argparse
+import concurrent.futures
+import glob
+import json
+import os
+import tempfile
+import typing
+
+from PIL import Image, ImageOps
+
+
+# Longest edge in pixels, None keeps the original size
+VARIANTS: typing.Dict[str, typing.Optional[int]] = {
+    "thumbnail": 320,
+    "game": 1280,
+    "full": None,
+}
+
+# No exif/icc arguments are passed to save, so metadata is stripped
+FORMATS: typing.Dict[str, dict] = {
+    "jpeg": {"format": "JPEG", "quality": 85, "optimize": True, "progressive": True},
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+}
+
+
+def derivative_path(output_path: str, image_id: str, variant: str, image_format: str) -> str:
+    return os.path.join(output_path, variant, f"{image_id}.{image_format}")
+
+
+def save_atomically(image: Image.Image, path: str, options: dict) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+    try:
+        with os.fdopen(file_descriptor, "wb") as output_file:
+            image.save(output_file, **options)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def process_image(source_path: str, output_path: str, overwrite: bool = False) -> typing.List[dict]:
+    # Runs in a worker process
+    image_id: str = os.path.splitext(os.path.basename(source_path))[0]
+    records: typing.List[dict] = []
+    source: typing.Optional[Image.Image] = None
+    try:
+        for variant, size in VARIANTS.items():
+            for image_format, options in FORMATS.items():
+                path: str = derivative_path(output_path, image_id, variant, image_format)
+                if overwrite or not os.path.exists(path):
+                    if source is None:
+                        with Image.open(source_path) as opened:
+                            source = ImageOps.exif_transpose(opened).convert("RGB")
+                    derivative: Image.Image = source
+                    if size is not None and max(source.size) > size:
+                        derivative = source.copy()
+                        derivative.thumbnail((size, size), Image.LANCZOS)
+                    save_atomically(derivative, path, options)
+                with Image.open(path) as written:
+                    width, height = written.size
+                records.append(
+                    {
+                        "image_id": image_id,
+                        "variant": variant,
+                        "format": image_format,
+                        "width": width,
+                        "height": height,
+                        "bytes": os.path.getsize(path),
+                    }
+                )
+    finally:
+        if source is not None:
+            source.close()
+    return records
+
+
+class DerivativePipeline:
+    source_path: str
+    output_path: str
+    workers: typing.Optional[int]
+
+    def __init__(
+        self, source_path: str, output_path: str, workers: typing.Optional[int] = None
+    ) -> None:
+        self.source_path = source_path
+        self.output_path = output_path
+        self.workers = workers
+
+    def sources(self) -> typing.List[str]:
+        # Recursive so sharded blob store directories work as a source too
+        return sorted(glob.glob(os.path.join(self.source_path, "**", "*.jpeg"), recursive=True))
+
+    def run(self, overwrite: bool = False) -> int:
+        manifest_path: str = os.path.join(self.output_path, "derivatives.jsonl")
+        os.makedirs(self.output_path, exist_ok=True)
+        processed: int = 0
+        with open(manifest_path, "w") as manifest, concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.workers
+        ) as executor:
+            futures: dict = {
+                executor.submit(process_image, source, self.output_path, overwrite): source
+                for source in self.sources()
+            }
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    records: typing.List[dict] = future.result()
+                except Exception as ex:
+                    print(f"Exception occured for {futures[future]}: {ex}")
+                    continue
+                for record in records:
+                    manifest.write(json.dumps(record) + "\n")
+                processed += 1
+                print(futures[future])
+        return processed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", default="./images")
+    parser.add_argument("--output", default="./derivatives")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args()
+
+    pipeline = DerivativePipeline(args.images, args.output, workers=args.workers)
+    print(f"Processed {pipeline.run(overwrite=args.overwrite)} images")
@@ -1,26 +1,71 @@
-import requests
 import urllib.parse
-import copy
 import typing
-import datetime
-import re
 import logging
 import time
 import json
-import os
+import concurrent.futures
 
-import logger
+from rate_limiter import HostRateLimiter
+from http_session import HTTPSession
+from checkpoint_store import CheckpointStore
+from crawl_frontier import CrawlFrontier, FrontierUnit
+from date_parser import date_parser
+from response_cache import ResponseCache
+from metrics import metrics
+from crawl_profiler import profiler
 
 logging.getLogger(__name__).setLevel(logging.DEBUG)
 
 
+def extract_image_options(json: dict, logger: logging.Logger) -> list:
+    image_options: list = []
+    try:
+        image_options = json["page"]
+    except KeyError:
+        pass
+    if image_options:
+        return image_options
+
+    try:
+        for resource in json["resources"]:
+            if "files" not in resource:
+                continue
+            for file_list in resource["files"]:
+                image_options += file_list
+    except KeyError as ex:
+        logger.warning(f"Exception occurred while assembling file list: {ex}")
+        return []
+
+    return image_options
+
+
+def select_largest_image(image_options: list, mimetype: typing.Optional[str] = "image/jpeg"):
+    if not image_options:
+        raise ValueError("No valid entries found.")
+    filter_func = lambda x: (mimetype is None) or (
+        "mimetype" in x and x["mimetype"] == mimetype
+    )
+    valid_entries = list(filter(filter_func, image_options))
+    if not valid_entries:
+        raise ValueError("No valid entries found for mimetype.")
+    return max(
+        valid_entries,
+        key=lambda x: x["size"]
+        if "size" in x
+        else x["width"] * x["height"]
+        if ("width" in x and "height" in x)
+        else 0,
+    )
+
+
 class LOCBase:
     json: dict
     id: str
     logger: logging.Logger = logging.getLogger(__name__)
 
     def __init__(self, json: dict, id: str) -> None:
-        self.json = copy.deepcopy(json)
+        # API responses are parsed fresh per request and never shared, no copy needed
+        self.json = json
         self.id = id
 
     def __str__(self) -> str:
@@ -47,25 +92,8 @@ class LOCResource(LOCBase):
             return "image" in online_format
 
     def get_image_options(self):
-        image_options: list = []
-        try:
-            image_options = self.json["page"]
-        except KeyError:
-            pass
-        if image_options:
-            return image_options
-
-        try:
-            for resource in self.json["resources"]:
-                if "files" not in resource:
-                    continue
-                for file_list in resource["files"]:
-                    image_options += file_list
-        except KeyError as ex:
-            self.logger.warning(f"Exception occurred while assembling file list: {ex}")
-            return []
-
-        return image_options
+        with profiler.phase("image_options"):
+            return extract_image_options(self.json, self.logger)
 
     def current_page(self):
         try:
@@ -80,96 +108,121 @@ class LOCResource(LOCBase):
             return 1
 
     def largest_image(self, mimetype: typing.Optional[str] = "image/jpeg"):
-        image_options = self.get_image_options()
-        if not image_options:
-            raise ValueError("No valid entries found.")
-        filter_func = lambda x: (mimetype is None) or (
-            "mimetype" in x and x["mimetype"] == mimetype
-        )
-        valid_entries = list(filter(filter_func, image_options))
-        if not valid_entries:
-            raise ValueError("No valid entries found for mimetype.")
-        return max(
-            valid_entries,
-            key=lambda x: x["size"]
-            if "size" in x
-            else x["width"] * x["height"]
-            if ("width" in x and "height" in x)
-            else 0,
-        )
+        with profiler.phase("largest_image"):
+            return select_largest_image(self.get_image_options(), mimetype)
 
     def other_pages(self):
-        pages: list = list(range(1, self.pages() + 1))
-        pages.remove(self.current_page())
-        return pages
+        with profiler.phase("other_pages"):
+            pages: list = list(range(1, self.pages() + 1))
+            pages.remove(self.current_page())
+            return pages
 
     def date(self, parse=True):
         date_entry = self.json["item"]["date"]
 
         if parse:
-            date_entry = str(date_entry)
-            date = None
-            possible_date_formats: list = [
-                "%Y-%m-%d",
-                "%d. %m. %Y",
-                "%d-%m-%Y",
-                "%d %B %Y",
-                "%d. %B %Y",
-                "%d. %b. %Y",
-                "%d %b %Y",
-                "%Y %B %d",
-                "%Y %B %d.",
-                "%Y %b. %d.",
-                "%Y %b %d",
-                "%m %Y",
-                "%m. %Y",
-                "%B %Y",
-                "%B. %Y",
-                "%B-%Y",
-                "%b %Y",
-                "%b. %Y",
-                "%b-%Y",
-                "%Y-%m",
-                "%Y %m",
-                "%Y-%B",
-                "%Y %B",
-                "%Y %B.",
-                "%Y-%b",
-                "%Y %b",
-                "%Y %b.",
-                "%Y",
-                "c%Y.",
-            ]
+            with profiler.phase("date"):
+                return date_parser.parse(date_entry)
+        else:
+            return date_entry
+
+    @profiler.phased("minimized_dict")
+    def minimized_dict(self):
+        d: dict = {}
+        d["date"] = str(self.date())
+        d["date_raw"] = self.date(parse=False)
+        d["jpeg"] = self.largest_image()
+        d["cite_this"] = self.json["cite_this"]
+        d["access_restricted"] = self.json["item"]["access_restricted"]
+        return d
 
-            possible_date_strings: list = [date_entry]
-            # if "item" in self.json and "sort_date" in self.json["item"]:
-            #    possible_date_strings.append(str(self.json["item"]["sort_date"]))
-            possible_date_strings.append(re.sub(r"^\D*(.*?)\D*$", r"\1", date_entry))
 
-            for date_string in possible_date_strings:
-                for date_format in possible_date_formats:
-                    try:
-                        date = datetime.datetime.strptime(str(date_string), date_format)
-                        break
-                    except ValueError:
-                        pass
-                if date is not None:
-                    break
-                self.logger.warning(f'Processing date string "{date_entry}"')
+class LOCResourceRecord:
+    # Only what minimized_dict and the crawl loop need, the response itself is
+    # dropped after parsing unless keep_json is set
+    __slots__ = (
+        "id",
+        "date_raw",
+        "current_page_number",
+        "page_count",
+        "image_options",
+        "cite_this",
+        "access_restricted",
+        "online_format",
+        "raw_json",
+    )
+    logger: typing.ClassVar[logging.Logger] = logging.getLogger(__name__)
+
+    def __init__(self, json: dict, id: str, keep_json: bool = False) -> None:
+        item: dict = json.get("item", {})
+        pagination: dict = json.get("pagination", {})
+        self.id = id
+        self.date_raw = item.get("date")
+        self.current_page_number: int = pagination.get("current", 1)
+        self.page_count: int = pagination.get("total", 1)
+        with profiler.phase("image_options"):
+            self.image_options: list = extract_image_options(json, self.logger)
+        self.cite_this: typing.Optional[dict] = json.get("cite_this")
+        self.access_restricted: typing.Optional[bool] = item.get("access_restricted")
+        self.online_format = item.get("online_format")
+        self.raw_json: typing.Optional[dict] = json if keep_json else None
+        if "access_restricted" in json and self.access_restricted:
+            raise ValueError(f'Access restricted for "{self.id}"')
+
+    @property
+    def json(self) -> dict:
+        if self.raw_json is None:
+            raise AttributeError("Raw JSON was not kept, construct with keep_json=True")
+        return self.raw_json
+
+    def require(self, value, name: str):
+        if value is None:
+            raise KeyError(name)
+        return value
 
-            if date is None:
-                raise ValueError(f'Could not parse "{date_entry}" as a datetime')
-            return date
+    def has_image(self) -> bool:
+        if self.online_format is None:
+            raise ValueError("Could not determine content type")
+        if type(self.online_format) == str:
+            return self.online_format == "image"
+        else:
+            return "image" in self.online_format
+
+    def get_image_options(self):
+        return self.image_options
+
+    def current_page(self):
+        return self.current_page_number
+
+    def pages(self):
+        return self.page_count
+
+    def largest_image(self, mimetype: typing.Optional[str] = "image/jpeg"):
+        with profiler.phase("largest_image"):
+            return select_largest_image(self.image_options, mimetype)
+
+    def other_pages(self):
+        with profiler.phase("other_pages"):
+            pages: list = list(range(1, self.pages() + 1))
+            pages.remove(self.current_page())
+            return pages
+
+    def date(self, parse=True):
+        date_entry = self.require(self.date_raw, "date")
+        if parse:
+            with profiler.phase("date"):
+                return date_parser.parse(date_entry)
         else:
             return date_entry
 
+    @profiler.phased("minimized_dict")
     def minimized_dict(self):
         d: dict = {}
         d["date"] = str(self.date())
         d["date_raw"] = self.date(parse=False)
         d["jpeg"] = self.largest_image()
-        d["cite_this"] = self.json["cite_this"]
-        d["access_restricted"] = self.json["item"]["access_restricted"]
+        d["cite_this"] = self.require(self.cite_this, "cite_this")
+        d["access_restricted"] = self.require(self.access_restricted, "access_restricted")
         return d
 
 
@@ -192,11 +245,27 @@ class LOCCrawler:
     base_url: str = "https://www.loc.gov/"
     default_params: dict
     default_headers: dict
+    session: HTTPSession
+    cache: typing.Optional[ResponseCache]
     logger: logging.Logger = logging.getLogger(__name__)
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        session: typing.Optional[HTTPSession] = None,
+        rate_limiter: typing.Optional[HostRateLimiter] = None,
+        cache: typing.Optional[ResponseCache] = None,
+    ) -> None:
         self.default_headers = {}
         self.default_params = {}
+        if session is None:
+            session = HTTPSession(rate_limiter=rate_limiter)
+        self.session = session
+        self.cache = cache
+
+    def build_url(self, rel: str, append_url: bool = True) -> str:
+        if append_url:
+            return urllib.parse.urljoin(self.base_url, rel)
+        return rel
 
     def make_request(
         self,
@@ -208,25 +277,19 @@ class LOCCrawler:
         timeout: int = 15,
     ):
         # Currently only supports GET
-        if append_url:
-            url: str = urllib.parse.urljoin(self.base_url, rel)
+        url: str = self.build_url(rel, append_url)
         self.logger.debug(f"Raw URL {url}")
 
-        for retry in range(retry_on_timeout + 1):
-            req = requests.get(
+        with profiler.phase("network"):
+            req = self.session.get(
                 url,
                 params={**self.default_params, **params},
                 headers={**self.default_headers, **headers},
+                retries=retry_on_timeout,
+                timeout=timeout,
             )
-            if not req.ok:
-                if (req.status_code in [429, 503]) and retry != retry_on_timeout:
-                    self.logger.warning(
-                        f"Received status {req.status_code} on retry {retry}. Retrying in {timeout} seconds"
-                    )
-                    time.sleep(timeout)
-                    continue
-                else:
-                    raise ValueError(f"Request failed: {req.status_code}")
+        if not req.ok:
+            raise ValueError(f"Request failed: {req.status_code}")
 
         self.logger.debug(f"Requested URL {req.url}")
         return req
@@ -235,12 +298,46 @@ class LOCCrawler:
         self, rel, params: dict = {}, headers: dict = {}, append_url: bool = True
     ):
         json_params: dict = {"fo": "json"}
-        return self.make_request(
-            rel=rel,
-            params={**self.default_params, **params, **json_params},
-            headers={**self.default_headers, **headers},
-            append_url=append_url,
-        ).json()
+        params = {**self.default_params, **params, **json_params}
+        headers = {**self.default_headers, **headers}
+        if self.cache is None:
+            req = self.make_request(rel=rel, params=params, headers=headers, append_url=append_url)
+            with profiler.phase("json"):
+                return req.json()
+
+        key: str = self.cache.key(self.build_url(rel, append_url), params)
+        entry = self.cache.lookup(key)
+        if entry is not None and self.cache.is_fresh(entry):
+            self.cache.hits += 1
+            metrics.inc("response_cache_total", result="hit")
+            with profiler.phase("cache_read"):
+                body: bytes = self.cache.read(entry)
+            with profiler.phase("json"):
+                return json.loads(body)
+        if entry is not None:
+            headers = {**headers, **self.cache.validators(entry)}
+
+        req = self.make_request(rel=rel, params=params, headers=headers, append_url=append_url)
+        if entry is not None and req.status_code == 304:
+            self.cache.revalidated += 1
+            metrics.inc("response_cache_total", result="revalidated")
+            self.cache.refresh(entry)
+            with profiler.phase("cache_read"):
+                body = self.cache.read(entry)
+            with profiler.phase("json"):
+                return json.loads(body)
+        self.cache.misses += 1
+        metrics.inc("response_cache_total", result="miss")
+        with profiler.phase("cache_write"):
+            self.cache.store(
+                key,
+                req.url,
+                req.content,
+                etag=req.headers.get("ETag"),
+                last_modified=req.headers.get("Last-Modified"),
+            )
+        with profiler.phase("json"):
+            return req.json()
 
     def get_resource(
         self,
@@ -260,8 +357,44 @@ class LOCCrawler:
             self.json_request(rel=rel, params=params, append_url=append_url), id
         )
 
-    def get_collection(self, rel: str, append_url: bool = True) -> LOCCollection:
-        return LOCCollection(self.json_request(rel, append_url=append_url), id=rel)
+    def get_resource_record(
+        self, id: str, page: typing.Optional[int] = None, append_url: bool = True
+    ) -> LOCResourceRecord:
+        params: dict = {}
+        if page is not None:
+            params["sp"] = page
+        json: dict = self.json_request(rel=id, params=params, append_url=append_url)
+        with profiler.phase("record"):
+            return LOCResourceRecord(json, id)
+
+    def get_collection(
+        self, rel: str, append_url: bool = True, params: dict = {}
+    ) -> LOCCollection:
+        return LOCCollection(
+            self.json_request(rel, params=params, append_url=append_url), id=rel
+        )
+
+    def iter_collection_pages(
+        self, collection_id: str, page_size: int = 100
+    ) -> typing.Iterator[LOCCollection]:
+        # The next listing page is fetched while the caller works on the current one
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as prefetcher:
+            future: typing.Optional[concurrent.futures.Future] = prefetcher.submit(
+                self.get_collection, collection_id, True, {"c": page_size}
+            )
+            while future is not None:
+                collection: LOCCollection = future.result()
+                try:
+                    # next_url already carries the page size
+                    next_rel: str = self.remove_base_url(collection.next_url())
+                    future = prefetcher.submit(self.get_collection, next_rel)
+                except KeyError:
+                    future = None
+                yield collection
+
+    def iter_items(self, collection_id: str, page_size: int = 100) -> typing.Iterator[str]:
+        for collection in self.iter_collection_pages(collection_id, page_size=page_size):
+            yield from collection.item_ids()
 
     def remove_base_url(self, url: str):
         if url.startswith(self.base_url):
@@ -284,128 +417,139 @@ class LOCCrawler:
         return cols
 
 
-if __name__ == "__main__":
-    import pprint
-
-    crawler = LOCCrawler()
-    collection_path: str = "./images.json"
-    if os.path.exists(collection_path):
-        with open(collection_path, "r") as collection_file:
-            collections: dict = json.load(collection_file)
-    else:
-        collections: dict = {}
-    c_ids: typing.List[str] = [
-        "free-to-use/main-streets",
-        "free-to-use/teachers-and-students/",
-        "free-to-use/kitchens-and-baths/",
-        #'free-to-use/books-maps-more/',
-        "free-to-use/natural-disasters/",
-        #'free-to-use/fish-and-fishing/',
-        #'free-to-use/skyscrapers/',
-        "free-to-use/older-people/",
-        "free-to-use/farm-life/",
-        "free-to-use/diners-drive-ins-restaurants/",
-        #'free-to-use/athletes/',
-        "free-to-use/aircraft/",
-        "free-to-use/families/",
-        "free-to-use/lighthouses/",
-        "free-to-use/disability-awareness/",
-        #'free-to-use/advertising-food/',
-        #'free-to-use/birds/',
-        #'free-to-use/american-revolution/',
-        "free-to-use/historic-sites/",
-        #'free-to-use/hats/',
-        "free-to-use/libraries/",
-        #'free-to-use/presidential-papers/',
-        #'free-to-use/art-of-the-book/',
-        "free-to-use/shoes/",
-        "free-to-use/games-for-fun-and-relaxation/",
-        "free-to-use/autumn-and-halloween/",
-        "free-to-use/work-in-america/",
-        #'free-to-use/tennis/',
-        #'free-to-use/independence-day/',
-        "free-to-use/weddings/",
-        #'free-to-use/horses/',
-        #'free-to-use/maps-of-cities/',
-        #'free-to-use/cherry-blossoms/',
-        "free-to-use/motion-picture-theaters/",
-        "free-to-use/discovery-and-exploration/",
-        #'free-to-use/veterans/',
-        #'free-to-use/genealogy/',
-        "free-to-use/cars/",
-        "free-to-use/hotels-motels-inns/",
-        #'free-to-use/ice-cream/',
-        "free-to-use/swimming-beaches/",
-        "free-to-use/cats/",
-        "free-to-use/historical-travel-pictures/",
-        #'free-to-use/african-american-women-changemakers/',
-        #'free-to-use/wwi-posters/',
-        #'free-to-use/poster-parade/',
-        #'free-to-use/bridges/',
-        #'free-to-use/not-an-ostrich/',
-        #'free-to-use/baseball-cards/',
-        #'free-to-use/japanese-prints/',
-        #'free-to-use/bicycles/',
-        #'free-to-use/irish-americans/',
-        "free-to-use/dogs/",
-        #'free-to-use/flickrcommons/',
-        #'free-to-use/public-domain-films-from-the-national-film-registry/',
-        #'free-to-use/abraham-lincoln/',
-        #'free-to-use/civil-war-drawings/',
-        #'free-to-use/classic-childrens-books/',
-        #'free-to-use/john-margolies-roadside-america-photograph-archive/',
-        #'free-to-use/c-m-bell-studio-collection/',
-        "free-to-use/architecture-and-design/",
-        #'free-to-use/travel-posters/',
-        #'free-to-use/womens-history-month/',
-        #'free-to-use/gottlieb-jazz-photos/',
-        #'free-to-use/us-presidential-inaugurations/',
-        #'free-to-use/football/',
-        "free-to-use/holidays/",
-        #'free-to-use/wpa-posters/',
-        #'free-to-use/thanksgiving/',
-        #'free-to-use/presidential-portraits/'
-    ]
-
-    for c_id in c_ids:
-        if c_id not in collections:
-            items: dict = {}
-        else:
-            items: dict = collections[c_id]
+class ConcurrentCrawler:
+    crawler: LOCCrawler
+    workers: int
+    logger: logging.Logger = logging.getLogger(__name__)
 
-        collection = crawler.get_collection(rel=c_id)
+    def __init__(self, crawler: LOCCrawler, workers: int = 4, page_size: int = 100) -> None:
+        self.crawler = crawler
+        self.workers = workers
+        self.page_size = page_size
 
-        for item_id in collection.item_ids():
-            if item_id in items and items[item_id]:
-                print("Skipped existing item")
-                continue
+    def fetch_page(self, item_id: str, page: typing.Optional[int] = None) -> tuple:
+        with metrics.timer("crawl_page_seconds"), profiler.item(item_id, page):
             try:
-                # time.sleep(1)
-                item = crawler.get_resource(item_id)
-                if item_id not in items:
-                    items[item_id] = {}
-                if (
-                    item.current_page() not in items[item_id]
-                    or not items[item_id][item.current_page()]
-                ):
-                    items[item_id][item.current_page()] = item.minimized_dict()
-                other_pages = item.other_pages()
-            except Exception as ex:
-                print(f"Exception occured: {ex}")
-                continue
-            for page in other_pages:
-                if page not in items[item_id] or not items[item_id][page]:
+                item = self.crawler.get_resource_record(item_id, page=page)
+                profiler.annotate(date_raw=item.date_raw, pages=item.page_count)
+                result: tuple = item.current_page(), item.minimized_dict(), item.other_pages()
+            except Exception:
+                metrics.inc("crawl_pages_total", result="failed")
+                raise
+        metrics.inc("crawl_pages_total", result="crawled")
+        return result
+
+    def crawl_collection(self, c_id: str, store: CheckpointStore) -> None:
+        item_ids: typing.Iterator[str] = self.crawler.iter_items(c_id, page_size=self.page_size)
+        exhausted: bool = False
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            # Results are only written to the store on this thread
+            pending: dict = {}
+            while True:
+                # Only pull as many item IDs as the pool can work on soon
+                while not exhausted and len(pending) < self.workers * 4:
+                    item_id: typing.Optional[str] = next(item_ids, None)
+                    if item_id is None:
+                        exhausted = True
+                    elif store.has_item(c_id, item_id):
+                        print("Skipped existing item")
+                    else:
+                        pending[executor.submit(self.fetch_page, item_id)] = (item_id, None)
+                if not pending:
+                    break
+
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    item_id, page = pending.pop(future)
                     try:
-                        item = crawler.get_resource(item_id, page=page)
-                        items[item_id][item.current_page()] = item.minimized_dict()
+                        current_page, minimized, other_pages = future.result()
                     except Exception as ex:
                         print(f"Exception occured: {ex}")
                         continue
-                else:
-                    print("Skipping existing page")
+                    if not store.has_page(c_id, item_id, current_page):
+                        store.put_page(c_id, item_id, current_page, minimized)
+                    if page is not None:
+                        continue
+                    for other_page in other_pages:
+                        if not store.has_page(c_id, item_id, other_page):
+                            future = executor.submit(self.fetch_page, item_id, other_page)
+                            pending[future] = (item_id, other_page)
+                        else:
+                            print("Skipping existing page")
+
+    def process_unit(
+        self, unit: FrontierUnit, frontier: CrawlFrontier, store: CheckpointStore
+    ) -> None:
+        if unit.kind == CrawlFrontier.COLLECTION_PAGE:
+            params: dict = {}
+            if unit.target == unit.collection:
+                # Later listing pages inherit the page size through next_url
+                params["c"] = self.page_size
+            collection = self.crawler.get_collection(rel=unit.target, params=params)
+            frontier.add_many(
+                (CrawlFrontier.ITEM, unit.collection, item_id, 0)
+                for item_id in collection.item_ids()
+                if not store.has_item(unit.collection, item_id)
+            )
+            try:
+                next_rel: str = self.crawler.remove_base_url(collection.next_url())
+            except KeyError:
+                return
+            frontier.add(CrawlFrontier.COLLECTION_PAGE, unit.collection, next_rel)
+            return
+
+        page: typing.Optional[int] = unit.page if unit.kind == CrawlFrontier.PAGE else None
+        current_page, minimized, other_pages = self.fetch_page(unit.target, page)
+        if not store.has_page(unit.collection, unit.target, current_page):
+            store.put_page(unit.collection, unit.target, current_page, minimized)
+        if unit.kind == CrawlFrontier.ITEM:
+            frontier.add_many(
+                (CrawlFrontier.PAGE, unit.collection, unit.target, other_page)
+                for other_page in other_pages
+                if not store.has_page(unit.collection, unit.target, other_page)
+            )
+
+    def frontier_worker(self, frontier: CrawlFrontier, store: CheckpointStore) -> None:
+        while True:
+            unit: typing.Optional[FrontierUnit] = frontier.claim()
+            if unit is None:
+                # Units held by other workers may still add new ones
+                if frontier.active() == 0:
+                    return
+                time.sleep(1)
+                continue
+            try:
+                self.process_unit(unit, frontier, store)
+            except Exception as ex:
+                print(f"Exception occured: {ex}")
+                frontier.fail(unit, str(ex))
+                continue
+            frontier.done(unit)
+
+    def crawl_frontier(
+        self, c_ids: typing.List[str], frontier: CrawlFrontier, store: CheckpointStore
+    ) -> None:
+        # Seeding is idempotent, so every process sharing the frontier can do it
+        frontier.add_many(
+            (CrawlFrontier.COLLECTION_PAGE, c_id, c_id, 0) for c_id in c_ids
+        )
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            workers: list = [
+                executor.submit(self.frontier_worker, frontier, store)
+                for _ in range(self.workers)
+            ]
+            for worker in workers:
+                worker.result()
+        print(f"Frontier: {frontier.counts()}")
+
+
+if __name__ == "__main__":
+    import sys
 
-        collections[c_id] = items
+    import cli
 
-    with open(collection_path, "w") as collection_file:
-        json.dump(collections, collection_file)
-    # pprint.pprint(collections)
+    # Kept for existing cron lines, same as "cli.py crawl"
+    cli.main(["crawl"] + sys.argv[1:])
@@ -2,4 +2,6 @@ import logging
 import sys
 
 
-logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+def configure(level: int = logging.INFO) -> None:
+    # Called by entry points only, importing a module must not reconfigure logging
+    logging.basicConfig(stream=sys.stdout, level=level)
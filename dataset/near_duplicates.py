@@ -0,0 +1,214 @@
+import argparse
+import concurrent.futures
+import glob
+import json
+import os
+import sqlite3
+import typing
+
+import numpy
+from PIL import Image
+
+
+HASH_SIZE: int = 8
+PHASH_SIZE: int = 32
+
+
+def dct_matrix(size: int) -> numpy.ndarray:
+    rows, columns = numpy.meshgrid(numpy.arange(size), numpy.arange(size), indexing="ij")
+    matrix: numpy.ndarray = numpy.cos(numpy.pi * (2 * columns + 1) * rows / (2 * size))
+    matrix[0] *= 1 / numpy.sqrt(2)
+    return matrix * numpy.sqrt(2 / size)
+
+
+DCT: numpy.ndarray = dct_matrix(PHASH_SIZE)
+
+
+def pack_bits(bits: numpy.ndarray) -> int:
+    return int.from_bytes(numpy.packbits(bits.flatten()).tobytes(), "big")
+
+
+def grayscale(image: Image.Image, width: int, height: int) -> numpy.ndarray:
+    return numpy.asarray(image.resize((width, height), Image.LANCZOS), dtype=numpy.float32)
+
+
+def image_hashes(path: str) -> typing.Tuple[str, float, int, int, int, int]:
+    # Runs in a worker process
+    with Image.open(path) as opened:
+        # Lets the JPEG decoder scale down while decoding
+        opened.draft("L", (PHASH_SIZE * 4, PHASH_SIZE * 4))
+        image: Image.Image = opened.convert("L")
+    small: numpy.ndarray = grayscale(image, HASH_SIZE, HASH_SIZE)
+    average_hash: int = pack_bits(small > small.mean())
+    wide: numpy.ndarray = grayscale(image, HASH_SIZE + 1, HASH_SIZE)
+    difference_hash: int = pack_bits(wide[:, 1:] > wide[:, :-1])
+    pixels: numpy.ndarray = grayscale(image, PHASH_SIZE, PHASH_SIZE)
+    low: numpy.ndarray = (DCT @ pixels @ DCT.T)[:HASH_SIZE, :HASH_SIZE]
+    # The DC term only carries overall brightness
+    perceptual_hash: int = pack_bits(low > numpy.median(low.flatten()[1:]))
+    stat = os.stat(path)
+    return path, stat.st_mtime, stat.st_size, average_hash, difference_hash, perceptual_hash
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    def __init__(self) -> None:
+        # Each node is [hash, payloads, {distance: child}]
+        self.root: typing.Optional[list] = None
+
+    def add(self, value: int, payload) -> None:
+        if self.root is None:
+            self.root = [value, [payload], {}]
+            return
+        node: list = self.root
+        while True:
+            distance: int = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(payload)
+                return
+            if distance not in node[2]:
+                node[2][distance] = [value, [payload], {}]
+                return
+            node = node[2][distance]
+
+    def search(self, value: int, radius: int) -> typing.Iterator[typing.Tuple[int, typing.Any]]:
+        if self.root is None:
+            return
+        stack: list = [self.root]
+        while stack:
+            node: list = stack.pop()
+            distance: int = hamming(value, node[0])
+            if distance <= radius:
+                for payload in node[1]:
+                    yield distance, payload
+            for child_distance, child in node[2].items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+
+
+class HashCache:
+    def __init__(self, path: str) -> None:
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            "path TEXT PRIMARY KEY, "
+            "mtime REAL NOT NULL, "
+            "size INTEGER NOT NULL, "
+            "ahash TEXT NOT NULL, "
+            "dhash TEXT NOT NULL, "
+            "phash TEXT NOT NULL)"
+        )
+
+    def known(self) -> typing.Dict[str, typing.Tuple[float, int]]:
+        return {
+            path: (mtime, size)
+            for path, mtime, size in self.connection.execute("SELECT path, mtime, size FROM hashes")
+        }
+
+    def store(self, rows: typing.List[tuple]) -> None:
+        # 64 bit hashes do not fit SQLite's signed integers, stored as hex
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO hashes (path, mtime, size, ahash, dhash, phash) VALUES (?, ?, ?, ?, ?, ?)",
+            [(path, mtime, size, f"{a:016x}", f"{d:016x}", f"{p:016x}") for path, mtime, size, a, d, p in rows],
+        )
+        self.connection.commit()
+
+    def forget_missing(self, paths: typing.Set[str]) -> None:
+        stale: list = [(path,) for path in self.known() if path not in paths]
+        self.connection.executemany("DELETE FROM hashes WHERE path = ?", stale)
+        self.connection.commit()
+
+    def all(self) -> typing.List[typing.Tuple[str, int, int, int, int]]:
+        return [
+            (path, size, int(a, 16), int(d, 16), int(p, 16))
+            for path, size, a, d, p in self.connection.execute(
+                "SELECT path, size, ahash, dhash, phash FROM hashes ORDER BY path"
+            )
+        ]
+
+
+def update_hashes(cache: HashCache, paths: typing.List[str], workers: typing.Optional[int]) -> int:
+    known: dict = cache.known()
+    todo: list = []
+    for path in paths:
+        stat = os.stat(path)
+        if known.get(path) != (stat.st_mtime, stat.st_size):
+            todo.append(path)
+    rows: list = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures: dict = {executor.submit(image_hashes, path): path for path in todo}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                rows.append(future.result())
+            except Exception as ex:
+                print(f"Exception occured for {futures[future]}: {ex}")
+            if len(rows) >= 500:
+                cache.store(rows)
+                rows.clear()
+    cache.store(rows)
+    cache.forget_missing(set(paths))
+    return len(todo)
+
+
+def find_groups(
+    entries: typing.List[typing.Tuple[str, int, int, int, int]],
+    phash_radius: int = 6,
+    dhash_radius: int = 10,
+) -> typing.List[typing.List[int]]:
+    parents: typing.List[int] = list(range(len(entries)))
+
+    def find(index: int) -> int:
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    tree = BKTree()
+    for index, (_, _, _, difference_hash, perceptual_hash) in enumerate(entries):
+        # Only earlier entries are in the tree, so every pair is looked at once
+        for _, other in tree.search(perceptual_hash, phash_radius):
+            if hamming(difference_hash, entries[other][3]) <= dhash_radius:
+                parents[find(index)] = find(other)
+        tree.add(perceptual_hash, index)
+
+    groups: typing.Dict[int, typing.List[int]] = {}
+    for index in range(len(entries)):
+        groups.setdefault(find(index), []).append(index)
+    return [members for members in groups.values() if len(members) > 1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", default="./images")
+    parser.add_argument("--cache", default="./hashes.sqlite")
+    parser.add_argument("--output", default="./duplicates.json")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--phash-radius", type=int, default=6)
+    parser.add_argument("--dhash-radius", type=int, default=10)
+    args = parser.parse_args()
+
+    paths: typing.List[str] = sorted(
+        glob.glob(os.path.join(args.images, "**", "*.jpeg"), recursive=True)
+    )
+    cache = HashCache(args.cache)
+    print(f"Hashed {update_hashes(cache, paths, args.workers)} new or changed of {len(paths)} images")
+
+    entries: list = cache.all()
+    groups: list = []
+    for members in find_groups(entries, args.phash_radius, args.dhash_radius):
+        # Largest file first, that one stays playable
+        members.sort(key=lambda index: -entries[index][1])
+        groups.append(
+            {
+                "image_ids": [
+                    os.path.splitext(os.path.basename(entries[index][0]))[0] for index in members
+                ],
+                "paths": [entries[index][0] for index in members],
+            }
+        )
+    with open(args.output, "w") as output_file:
+        json.dump(groups, output_file, indent=1)
+    print(f"{len(groups)} duplicate groups written to {args.output}")
@@ -0,0 +1,73 @@
+import threading
+import time
+import typing
+import urllib.parse
+
+
+class TokenBucket:
+    rate: float
+    capacity: float
+    tokens: float
+
+    def __init__(self, rate: float, capacity: typing.Optional[float] = None) -> None:
+        if rate <= 0:
+            raise ValueError("Rate has to be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated: float = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        # updated lies in the future while the bucket is paused
+        if now > self.updated:
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        waited: float = 0.0
+        while True:
+            with self.lock:
+                now: float = time.monotonic()
+                self._refill(now)
+                if now < self.updated:
+                    delay: float = self.updated - now
+                elif self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                else:
+                    delay = (tokens - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds: float) -> None:
+        with self.lock:
+            self.tokens = 0.0
+            self.updated = max(self.updated, time.monotonic() + seconds)
+
+
+class HostRateLimiter:
+    rate: float
+    capacity: typing.Optional[float]
+    buckets: typing.Dict[str, TokenBucket]
+
+    def __init__(self, rate: float, capacity: typing.Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, url: str) -> TokenBucket:
+        host: str = urllib.parse.urlparse(url).netloc
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.rate, self.capacity)
+            return self.buckets[host]
+
+    def acquire(self, url: str) -> float:
+        return self.bucket(url).acquire()
+
+    def pause(self, url: str, seconds: float) -> None:
+        self.bucket(url).pause(seconds)
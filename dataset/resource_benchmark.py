@@ -0,0 +1,108 @@
+import argparse
+import copy
+import glob
+import gzip
+import json
+import logging
+import os
+import time
+import tracemalloc
+import typing
+
+from loc_crawler import LOCResource, LOCResourceRecord
+
+
+def synthetic_payload(index: int, notes: int = 400, files: int = 40) -> bytes:
+    # Shaped like a loc.gov resource response, padded with the kind of
+    # nested metadata the real ones carry
+    payload: dict = {
+        "item": {
+            "date": "1936",
+            "access_restricted": False,
+            "online_format": ["image"],
+            "notes": [f"Note {note} on item {index} " * 8 for note in range(notes)],
+            "subjects": [{"title": f"Subject {subject}", "link": "https://www.loc.gov/"} for subject in range(notes // 4)],
+        },
+        "pagination": {"current": 1, "total": 2},
+        "cite_this": {"chicago": f"Item {index}.", "apa": f"Item {index}.", "mla": f"Item {index}."},
+        "resources": [
+            {
+                "files": [
+                    [
+                        {
+                            "mimetype": "image/jpeg",
+                            "url": f"https://tile.loc.gov/{index}/{file}.jpg",
+                            "width": 100 * (file + 1),
+                            "height": 80 * (file + 1),
+                        },
+                        {"mimetype": "image/tiff", "url": f"https://tile.loc.gov/{index}/{file}.tif", "size": 1000000},
+                    ]
+                    for file in range(files)
+                ]
+            }
+        ],
+    }
+    return json.dumps(payload).encode("utf-8")
+
+
+def cached_payloads(directory: str, limit: int) -> typing.List[bytes]:
+    payloads: typing.List[bytes] = []
+    for path in glob.glob(os.path.join(directory, "*", "*.gz")):
+        with gzip.open(path, "rb") as body_file:
+            body: bytes = body_file.read()
+        if b'"item"' in body and b'"cite_this"' in body:
+            payloads.append(body)
+        if len(payloads) >= limit:
+            break
+    return payloads
+
+
+CONSTRUCTORS: typing.Dict[str, typing.Callable[[dict, str], typing.Any]] = {
+    "LOCResource + deepcopy": lambda payload, id: LOCResource(copy.deepcopy(payload), id),
+    "LOCResource": LOCResource,
+    "LOCResourceRecord": LOCResourceRecord,
+}
+
+
+def throughput(constructor: typing.Callable, parsed: typing.List[dict], repeat: int) -> float:
+    start: float = time.perf_counter()
+    for _ in range(repeat):
+        for index, payload in enumerate(parsed):
+            resource = constructor(payload, str(index))
+            resource.minimized_dict()
+            resource.other_pages()
+    return len(parsed) * repeat / (time.perf_counter() - start)
+
+
+def memory(constructor: typing.Callable, payloads: typing.List[bytes]) -> typing.Tuple[int, int]:
+    # Objects are built from the raw body like in the crawl and kept alive,
+    # so current is what stays resident and peak includes parsing
+    tracemalloc.start()
+    kept: list = [constructor(json.loads(body), str(index)) for index, body in enumerate(payloads)]
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return current, peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cache", default=None, help="Response cache directory with recorded resources")
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    logging.getLogger("date_parser").setLevel(logging.ERROR)
+
+    if args.cache is not None:
+        payloads: typing.List[bytes] = cached_payloads(args.cache, args.items)
+    else:
+        payloads = [synthetic_payload(index) for index in range(args.items)]
+    parsed: typing.List[dict] = [json.loads(body) for body in payloads]
+    average_size: float = sum(len(body) for body in payloads) / len(payloads)
+    print(f"{len(payloads)} resources, {average_size / 1024:.0f} KiB average JSON")
+
+    print(f"{'class':<24} {'items/s':>10} {'resident KiB/item':>18} {'peak MiB':>9}")
+    for name, constructor in CONSTRUCTORS.items():
+        rate: float = throughput(constructor, parsed, args.repeat)
+        current, peak = memory(constructor, payloads)
+        print(f"{name:<24} {rate:>10.0f} {current / len(payloads) / 1024:>18.1f} {peak / 1024**2:>9.1f}")
@@ -0,0 +1,175 @@
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import typing
+
+
+class CacheEntry(typing.NamedTuple):
+    key: str
+    url: str
+    etag: typing.Optional[str]
+    last_modified: typing.Optional[str]
+    stored: float
+    size: int
+
+
+class ResponseCache:
+    directory: str
+    max_bytes: int
+    ttl: typing.Optional[float]
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 1024**3,
+        ttl: typing.Optional[float] = 7 * 24 * 3600,
+    ) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # None keeps entries fresh forever, useful to replay a crawl offline
+        self.ttl = ttl
+        self.hits: int = 0
+        self.revalidated: int = 0
+        self.misses: int = 0
+        os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            os.path.join(directory, "index.sqlite"), check_same_thread=False
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, "
+            "url TEXT NOT NULL, "
+            "etag TEXT, "
+            "last_modified TEXT, "
+            "stored REAL NOT NULL, "
+            "accessed REAL NOT NULL, "
+            "size INTEGER NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)"
+        )
+        self.connection.commit()
+
+    def key(self, url: str, params: dict) -> str:
+        unhashed: str = url + "?" + json.dumps(params, sort_keys=True, default=str)
+        return hashlib.sha256(unhashed.encode("utf-8")).hexdigest()
+
+    def body_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".gz")
+
+    def lookup(self, key: str) -> typing.Optional[CacheEntry]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT key, url, etag, last_modified, stored, size FROM entries WHERE key = ?",
+                (key,),
+            ).fetchone()
+        if row is None or not os.path.exists(self.body_path(key)):
+            return None
+        return CacheEntry(*row)
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return self.ttl is None or time.time() - entry.stored < self.ttl
+
+    def validators(self, entry: CacheEntry) -> dict:
+        headers: dict = {}
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def read(self, entry: CacheEntry) -> bytes:
+        with gzip.open(self.body_path(entry.key), "rb") as body_file:
+            body: bytes = body_file.read()
+        with self.lock:
+            self.connection.execute(
+                "UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), entry.key)
+            )
+            self.connection.commit()
+        return body
+
+    def refresh(self, entry: CacheEntry) -> None:
+        # Upstream answered 304, the stored body is current again
+        with self.lock:
+            self.connection.execute(
+                "UPDATE entries SET stored = ?, accessed = ? WHERE key = ?",
+                (time.time(), time.time(), entry.key),
+            )
+            self.connection.commit()
+
+    def store(
+        self,
+        key: str,
+        url: str,
+        body: bytes,
+        etag: typing.Optional[str] = None,
+        last_modified: typing.Optional[str] = None,
+    ) -> None:
+        path: str = self.body_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        try:
+            with os.fdopen(file_descriptor, "wb") as raw_file:
+                with gzip.GzipFile(fileobj=raw_file, mode="wb", compresslevel=6) as body_file:
+                    body_file.write(body)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        now: float = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO entries (key, url, etag, last_modified, stored, accessed, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, url, etag, last_modified, now, now, os.path.getsize(path)),
+            )
+            self.connection.commit()
+        self.evict()
+
+    def size(self) -> int:
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()[0]
+
+    def evict(self) -> int:
+        excess: int = self.size() - self.max_bytes
+        removed: int = 0
+        if excess <= 0:
+            return removed
+        with self.lock:
+            rows: list = self.connection.execute(
+                "SELECT key, size FROM entries ORDER BY accessed"
+            ).fetchall()
+            for key, size in rows:
+                if excess <= 0:
+                    break
+                try:
+                    os.remove(self.body_path(key))
+                except FileNotFoundError:
+                    pass
+                self.connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+                excess -= size
+                removed += 1
+            self.connection.commit()
+        return removed
+
+    def info(self) -> typing.Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "bytes": self.size(),
+            "max_bytes": self.max_bytes,
+        }
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,67 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import typing
+
+CLI_PATH: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cli.py")
+# Must never be imported just to print help or the config
+HEAVY_MODULES: typing.Tuple[str, ...] = ("requests", "mariadb", "PIL", "numpy", "urllib3")
+CASES: typing.List[typing.List[str]] = [
+    ["--help"],
+    ["crawl", "--help"],
+    ["download", "--help"],
+    ["ingest", "--help"],
+    ["verify", "--help"],
+    ["--print-config"],
+]
+
+
+def time_command(command: typing.List[str], repeat: int) -> typing.List[float]:
+    timings: typing.List[float] = []
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def heavy_imports(arguments: typing.List[str]) -> typing.List[str]:
+    # -X importtime lists every module loaded, one "import time: self | cumulative | name" line each
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", CLI_PATH] + arguments,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    loaded: typing.Set[str] = set()
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and line.count("|") == 2:
+            loaded.add(line.rsplit("|", 1)[1].strip().split(".")[0])
+    return sorted(loaded.intersection(HEAVY_MODULES))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Startup latency of the dataset CLI")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--target-ms", type=float, default=150.0, help="Median budget per invocation")
+    args = parser.parse_args()
+
+    baseline: float = statistics.median(time_command([sys.executable, "-c", "pass"], args.repeat))
+    print(f"Interpreter alone: {baseline * 1000:.1f} ms")
+    print(f"{'command':<24} {'median ms':>10} {'max ms':>8} {'over python':>12}  heavy imports")
+    failed: bool = False
+    for arguments in CASES:
+        timings: typing.List[float] = time_command([sys.executable, CLI_PATH] + arguments, args.repeat)
+        median: float = statistics.median(timings)
+        heavy: typing.List[str] = heavy_imports(arguments)
+        failed = failed or median * 1000 > args.target_ms or bool(heavy)
+        print(
+            f"{' '.join(arguments):<24} {median * 1000:>10.1f} {max(timings) * 1000:>8.1f} "
+            f"{(median - baseline) * 1000:>12.1f}  {', '.join(heavy) or '-'}"
+        )
+    if failed:
+        raise SystemExit(f"Startup over {args.target_ms:.0f} ms or heavy modules imported")
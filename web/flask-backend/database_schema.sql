@@ -63,6 +63,60 @@ CREATE TABLE `collections` (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
+--
+-- Table structure for table `guess_stats_decades`
+--
+
+DROP TABLE IF EXISTS `guess_stats_decades`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `guess_stats_decades` (
+  `decade` int(11) NOT NULL,
+  `guess_count` int(11) NOT NULL DEFAULT 0,
+  `guess_sum` bigint(20) NOT NULL DEFAULT 0,
+  `guess_sum_squares` bigint(20) NOT NULL DEFAULT 0,
+  `error_sum` bigint(20) NOT NULL DEFAULT 0,
+  `abs_error_sum` bigint(20) NOT NULL DEFAULT 0,
+  `error_sum_squares` bigint(20) NOT NULL DEFAULT 0,
+  `errors_0` int(11) NOT NULL DEFAULT 0,
+  `errors_1` int(11) NOT NULL DEFAULT 0,
+  `errors_3` int(11) NOT NULL DEFAULT 0,
+  `errors_6` int(11) NOT NULL DEFAULT 0,
+  `errors_11` int(11) NOT NULL DEFAULT 0,
+  `errors_26` int(11) NOT NULL DEFAULT 0,
+  `errors_51` int(11) NOT NULL DEFAULT 0,
+  PRIMARY KEY (`decade`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `guess_stats_items`
+--
+
+DROP TABLE IF EXISTS `guess_stats_items`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `guess_stats_items` (
+  `item_id` varchar(100) NOT NULL,
+  `page` int(11) NOT NULL,
+  `guess_count` int(11) NOT NULL DEFAULT 0,
+  `guess_sum` bigint(20) NOT NULL DEFAULT 0,
+  `guess_sum_squares` bigint(20) NOT NULL DEFAULT 0,
+  `error_sum` bigint(20) NOT NULL DEFAULT 0,
+  `abs_error_sum` bigint(20) NOT NULL DEFAULT 0,
+  `error_sum_squares` bigint(20) NOT NULL DEFAULT 0,
+  `errors_0` int(11) NOT NULL DEFAULT 0,
+  `errors_1` int(11) NOT NULL DEFAULT 0,
+  `errors_3` int(11) NOT NULL DEFAULT 0,
+  `errors_6` int(11) NOT NULL DEFAULT 0,
+  `errors_11` int(11) NOT NULL DEFAULT 0,
+  `errors_26` int(11) NOT NULL DEFAULT 0,
+  `errors_51` int(11) NOT NULL DEFAULT 0,
+  PRIMARY KEY (`item_id`,`page`),
+  CONSTRAINT `guess_stats_items_FK` FOREIGN KEY (`item_id`, `page`) REFERENCES `items` (`item_id`, `page`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
 --
 -- Table structure for table `guesses`
 --
@@ -80,6 +134,24 @@ CREATE TABLE `guesses` (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
+--
+-- Table structure for table `image_derivatives`
+--
+
+DROP TABLE IF EXISTS `image_derivatives`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `image_derivatives` (
+  `image_id` varchar(64) NOT NULL,
+  `variant` varchar(32) NOT NULL,
+  `format` varchar(16) NOT NULL,
+  `width` int(11) NOT NULL,
+  `height` int(11) NOT NULL,
+  `bytes` int(11) NOT NULL,
+  PRIMARY KEY (`image_id`,`variant`,`format`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
 --
 -- Table structure for table `images`
 --
@@ -91,7 +163,9 @@ CREATE TABLE `images` (
   `item_id` varchar(100) NOT NULL,
   `page` int(11) NOT NULL,
   `image_id` varchar(64) NOT NULL,
+  `ending` varchar(16) NOT NULL DEFAULT 'jpeg',
   PRIMARY KEY (`item_id`,`page`),
+  KEY `images_image_id` (`image_id`),
   CONSTRAINT `images_FK` FOREIGN KEY (`item_id`, `page`) REFERENCES `items` (`item_id`, `page`) ON DELETE CASCADE ON UPDATE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8;
 /*!40101 SET character_set_client = @saved_cs_client */;
@@ -109,6 +183,7 @@ CREATE TABLE `items` (
   `date` date DEFAULT NULL,
   `date_raw` varchar(100) DEFAULT NULL,
   `cite_as` text DEFAULT NULL,
+  `playable` tinyint(1) NOT NULL DEFAULT 1,
   PRIMARY KEY (`item_id`,`page`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8;
 /*!40101 SET character_set_client = @saved_cs_client */;
@@ -1,56 +1,281 @@
-import mariadb
+import argparse
 import typing
 import json
 import datetime
 import hashlib
+import sqlite3
+import time
+import threading
+import contextlib
+
+# Imported by DBHandler.__init__, so the SQLite stand-in and dry runs work without the connector
+if typing.TYPE_CHECKING:
+    import mariadb
+
+
+def image_id(item_id: str, page: int, hasher=hashlib.sha256) -> str:
+    unhashed: str = item_id.strip("/") + "/" + str(page)
+    return hasher(unhashed.encode("utf-8")).hexdigest()
+
+
+def page_rows(
+    rows: typing.Dict[str, list], collection: str, item: str, page: int, entry: dict, image_id: str
+) -> None:
+    # Appends one crawled page to per-table row lists keyed like DBHandler.bulk_statements
+    date: datetime.datetime = datetime.datetime.fromisoformat(entry["date"])
+    rows["items"].append((item, page, date.strftime("%Y-%m-%d"), entry["date_raw"]))
+    rows["images"].append((item, page, image_id, "jpeg"))
+    rows["collection_items"].append((item, page, collection))
+    for style in entry["cite_this"]:
+        rows["cite_as"].append((item, page, style, entry["cite_this"][style]))
 
 
 class DBHandler:
-    def __init__(self, config_path: str) -> None:
+    # Errors a retry cannot fix, e.g. a foreign key violation, set from the driver in __init__
+    integrity_errors: typing.Tuple[type, ...] = ()
+    # Insert order matters, later tables reference earlier ones
+    bulk_statements: typing.Dict[str, str] = {
+        "collections": "INSERT IGNORE INTO collections (collection_id) VALUES (?)",
+        "items": "INSERT IGNORE INTO items (item_id, page, date, date_raw) VALUES (?, ?, ?, ?)",
+        "images": "INSERT IGNORE INTO images (item_id, page, image_id, ending) VALUES (?, ?, ?, ?)",
+        "collection_items": "INSERT IGNORE INTO collection_items (item_id, page, collection_id) VALUES (?, ?, ?)",
+        "cite_as": "INSERT IGNORE INTO cite_as (item_id, page, style, citation) VALUES (?, ?, ?, ?)",
+    }
+
+    def __init__(
+        self,
+        config_path: str,
+        pool_size: int = 8,
+        checkout_timeout: float = 5.0,
+        validation_interval: int = 500,
+        metrics=None,
+    ) -> None:
         with open(config_path, "r") as config_file:
             self.config: dict = json.load(config_file)
         self.hasher = hashlib.sha256
-        self.connection: mariadb.Connection = mariadb.connect(**self.config)
-        self.connection.autocommit = True
-        # self.cursor: mariadb.Cursor = self.connection.cursor()
+        self.checkout_timeout = checkout_timeout
+        import mariadb
+
+        self.integrity_errors = (mariadb.IntegrityError, mariadb.DataError)
+        self.pool_error: typing.Type[Exception] = mariadb.PoolError
+        # Connections idle for longer than validation_interval ms are pinged on checkout
+        self.pool = mariadb.ConnectionPool(
+            pool_name=f"year_guesser_{id(self)}",
+            pool_size=pool_size,
+            pool_validation_interval=validation_interval,
+            **self.config,
+        )
+        self.local = threading.local()
+        self.listeners: list = []
+        # Optional registry with inc() and observe(), e.g. dataset/metrics.py
+        self.metrics = metrics
+
+    def add_listener(self, listener) -> None:
+        # Listeners implement items_ingested(keys), items_deleted() and items_unplayable(keys)
+        self.listeners.append(listener)
+
+    def notify_ingested(self, keys: typing.List[typing.Tuple[str, int]]) -> None:
+        for listener in self.listeners:
+            listener.items_ingested(keys)
+
+    def notify_deleted(self) -> None:
+        for listener in self.listeners:
+            listener.items_deleted()
+
+    def notify_unplayable(self, keys: typing.List[typing.Tuple[str, int]]) -> None:
+        for listener in self.listeners:
+            listener.items_unplayable(keys)
+
+    def checkout(self) -> "mariadb.Connection":
+        deadline: float = time.monotonic() + self.checkout_timeout
+        while True:
+            try:
+                connection = self.pool.get_connection()
+            except self.pool_error:
+                connection = None
+            if connection is not None:
+                connection.autocommit = True
+                return connection
+            if time.monotonic() >= deadline:
+                raise TimeoutError(
+                    f"No database connection available after {self.checkout_timeout} seconds"
+                )
+            time.sleep(0.005)
+
+    @contextlib.contextmanager
+    def connection(self) -> typing.Iterator["mariadb.Connection"]:
+        # The outermost scope on a thread (e.g. one Flask request) checks out a
+        # connection, nested calls on the same thread reuse it and its cursor
+        if getattr(self.local, "connection", None) is not None:
+            yield self.local.connection
+            return
+        connection = self.checkout()
+        self.local.connection = connection
+        self.local.cursor = None
+        try:
+            yield connection
+        finally:
+            if self.local.cursor is not None:
+                self.local.cursor.close()
+            self.local.connection = None
+            self.local.cursor = None
+            # Returns the connection to the pool
+            connection.close()
+
+    def execute(self, cursor: "mariadb.Cursor", query: str, parameters: typing.Sequence = ()):
+        start: float = time.perf_counter()
+        cursor.execute(query, parameters)
+        if self.metrics is not None:
+            kind: str = query.split(None, 1)[0].upper()
+            self.metrics.inc("db_round_trips_total", kind=kind)
+            self.metrics.observe("db_query_seconds", time.perf_counter() - start, kind=kind)
+            if kind == "INSERT":
+                self.metrics.inc("db_rows_inserted_total", max(cursor.rowcount, 0))
+
+    def executemany(self, cursor: "mariadb.Cursor", query: str, rows: typing.Sequence):
+        start: float = time.perf_counter()
+        cursor.executemany(query, rows)
+        if self.metrics is not None:
+            kind: str = query.split(None, 1)[0].upper()
+            self.metrics.inc("db_round_trips_total", kind=kind)
+            self.metrics.observe("db_query_seconds", time.perf_counter() - start, kind=kind)
+            if kind == "INSERT":
+                self.metrics.inc("db_rows_inserted_total", max(cursor.rowcount, 0))
+
+    @contextlib.contextmanager
+    def cursor(self, buffered: bool = True) -> typing.Iterator["mariadb.Cursor"]:
+        with self.connection() as connection:
+            if not buffered:
+                # Streams rows from the server instead of fetching the whole result up front.
+                # Never the shared cursor, the connection is busy until every row is read
+                streaming: "mariadb.Cursor" = connection.cursor(buffered=False)
+                try:
+                    yield streaming
+                finally:
+                    streaming.close()
+                return
+            if self.local.cursor is None:
+                self.local.cursor = connection.cursor()
+            yield self.local.cursor
 
     def get_ids(self):
-        cursor = self.connection.cursor()
-        cursor.execute("SELECT item_id, page FROM items")
-        return cursor.fetchall()
+        with self.cursor() as cursor:
+            self.execute(cursor, "SELECT item_id, page FROM items")
+            return cursor.fetchall()
 
-    def load_from_json(self, path: str):
+    def load_from_json(self, path: str, bulk: bool = False, chunk_size: int = 1000):
         input_dict: dict
         with open(path, "r") as json_file:
             input_dict = json.load(json_file)
-        for collection_index in input_dict:
-            collection: str = collection_index.strip("/")
-            print(collection)
-            if not self.collection_exists(collection):
-                try:
-                    self.add_collection(collection)
-                except Exception as ex:
-                    pass
+        load_pages = self.load_pages
+        if bulk:
+            load_pages = lambda pages: self.bulk_load_pages(pages, chunk_size=chunk_size)
+        load_pages(
+            (collection_index, item_index, page_index, input_dict[collection_index][item_index][page_index])
+            for collection_index in input_dict
+            for item_index in input_dict[collection_index]
+            for page_index in input_dict[collection_index][item_index]
+        )
+
+    def load_from_store(self, path: str, bulk: bool = False, chunk_size: int = 1000):
+        # Streams rows from the crawler's checkpoint store (dataset/checkpoint_store.py)
+        store = sqlite3.connect(path)
+        load_pages = self.load_pages
+        if bulk:
+            load_pages = lambda pages: self.bulk_load_pages(pages, chunk_size=chunk_size)
+        try:
+            load_pages(
+                (collection_index, item_index, page_index, json.loads(data))
+                for collection_index, item_index, page_index, data in store.execute(
+                    "SELECT collection, item_id, page, data FROM pages ORDER BY collection, item_id, page"
+                )
+            )
+        finally:
+            store.close()
+
+    def load_pages(self, pages: typing.Iterable[tuple]):
+        with self.connection():
+            current_collection: typing.Optional[str] = None
+            for collection_index, item_index, page_index, entry in pages:
+                collection: str = collection_index.strip("/")
+                if collection != current_collection:
+                    current_collection = collection
+                    print(collection)
+                    if not self.collection_exists(collection):
+                        try:
+                            self.add_collection(collection)
+                        except Exception as ex:
+                            pass
 
-            for item_index in input_dict[collection_index]:
                 item = item_index.strip("/")
-                for page_index in input_dict[collection_index][item_index]:
-                    page = int(page_index)
-                    print(f"{collection} - {item} - {page}")
-                    self.add_full_item(
-                        item, page, input_dict[collection_index][item_index][page_index]
-                    )
-                    # exit(0)
+                page = int(page_index)
+                print(f"{collection} - {item} - {page}")
+                self.add_full_item(item, page, entry, [collection])
+
+    def bulk_load_pages(self, pages: typing.Iterable[tuple], chunk_size: int = 1000) -> dict:
+        rows: typing.Dict[str, list] = {table: [] for table in self.bulk_statements}
+        stats: dict = {"pages": 0, "rows": 0, "seconds": 0.0}
+        seen_collections: set = set()
+        buffered: int = 0
+        start: float = time.perf_counter()
+
+        with self.connection() as connection:
+            connection.autocommit = False
+            try:
+                for collection_index, item_index, page_index, entry in pages:
+                    collection: str = collection_index.strip("/")
+                    item: str = item_index.strip("/")
+                    page: int = int(page_index)
+                    if collection not in seen_collections:
+                        seen_collections.add(collection)
+                        rows["collections"].append((collection,))
+                    page_rows(rows, collection, item, page, entry, self.get_image_id(item, page))
+                    buffered += 1
+
+                    if buffered >= chunk_size:
+                        stats["rows"] += self.flush_bulk_rows(rows)
+                        stats["pages"] += buffered
+                        buffered = 0
+                        self.report_bulk_progress(stats, start)
+                stats["rows"] += self.flush_bulk_rows(rows)
+                stats["pages"] += buffered
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                connection.autocommit = True
+
+        self.report_bulk_progress(stats, start)
+        return stats
+
+    def flush_bulk_rows(self, rows: typing.Dict[str, list]) -> int:
+        count: int = 0
+        keys: list = [(row[0], row[1]) for row in rows["items"]]
+        with self.connection() as connection, self.cursor() as cursor:
+            for table, statement in self.bulk_statements.items():
+                if rows[table]:
+                    self.executemany(cursor, statement, rows[table])
+                    count += len(rows[table])
+                    rows[table].clear()
+            connection.commit()
+        self.notify_ingested(keys)
+        return count
+
+    def report_bulk_progress(self, stats: dict, start: float):
+        stats["seconds"] = time.perf_counter() - start
+        rate: float = stats["rows"] / stats["seconds"] if stats["seconds"] else 0.0
+        print(
+            f"{stats['pages']} pages, {stats['rows']} rows in {stats['seconds']:.1f}s ({rate:.0f} rows/s)"
+        )
 
     def add_collection(self, id: str):
-        cursor = self.connection.cursor()
-        cursor.execute("INSERT INTO collections (collection_id) VALUES (?)", (id,))
-        return cursor
+        with self.cursor() as cursor:
+            self.execute(cursor, "INSERT INTO collections (collection_id) VALUES (?)", (id,))
 
     def boolean_selection(self, query: str, items: tuple):
-        cursor = self.connection.cursor()
-        cursor.execute(query, items)
-        return bool(cursor.fetchall())
+        with self.cursor() as cursor:
+            self.execute(cursor, query, items)
+            return bool(cursor.fetchall())
 
     def collection_exists(self, id: str):
         return self.boolean_selection(
@@ -83,6 +308,8 @@ class DBHandler:
             if not self.item_citation_exists(item_id, page, style):
                 self.add_item_citation(item_id, page, style, item["cite_this"][style])
 
+        self.notify_ingested([(item_id, page)])
+
     def item_citation_exists(self, item_id: str, page: int, style: str):
         return self.boolean_selection(
             "SELECT item_id, page, style FROM cite_as WHERE (item_id = ? AND page = ? AND style = ?)",
@@ -90,11 +317,12 @@ class DBHandler:
         )
 
     def add_item_citation(self, item_id: str, page: int, style: str, citation: str):
-        cursor = self.connection.cursor()
-        cursor.execute(
-            "INSERT INTO cite_as (item_id, page, style, citation) VALUES (?, ?, ?, ?)",
-            (item_id, page, style, citation),
-        )
+        with self.cursor() as cursor:
+            self.execute(
+                cursor,
+                "INSERT INTO cite_as (item_id, page, style, citation) VALUES (?, ?, ?, ?)",
+                (item_id, page, style, citation),
+            )
 
     def collection_item_exists(self, item_id: str, page: int, collection_id: str):
         return self.boolean_selection(
@@ -109,19 +337,21 @@ class DBHandler:
         if not self.collection_exists(collection_id):
             raise KeyError(f"Collection {collection_id} does not exist")
 
-        cursor = self.connection.cursor()
-        cursor.execute(
-            "INSERT INTO collection_items (item_id, page, collection_id) VALUES (?, ?, ?)",
-            (item_id, page, collection_id),
-        )
+        with self.cursor() as cursor:
+            self.execute(
+                cursor,
+                "INSERT INTO collection_items (item_id, page, collection_id) VALUES (?, ?, ?)",
+                (item_id, page, collection_id),
+            )
 
     def add_item(self, id: str, page: int, date: datetime.datetime, date_raw: str):
-        cursor = self.connection.cursor()
-        date_string: str = date.strftime("%Y-%m-%d")
-        cursor.execute(
-            "INSERT INTO items (item_id, page, date, date_raw) VALUES (?, ?, ?, ?)",
-            (id, page, date_string, date_raw),
-        )
+        with self.cursor() as cursor:
+            date_string: str = date.strftime("%Y-%m-%d")
+            self.execute(
+                cursor,
+                "INSERT INTO items (item_id, page, date, date_raw) VALUES (?, ?, ?, ?)",
+                (id, page, date_string, date_raw),
+            )
 
     def item_exists(self, id: str, page: int):
         return self.boolean_selection(
@@ -133,11 +363,12 @@ class DBHandler:
         )
 
     def add_image(self, item_id: str, page: int, image_id: str, ending: str = "jpeg"):
-        cursor = self.connection.cursor()
-        cursor.execute(
-            "INSERT INTO images (item_id, page, image_id, ending) VALUES (?, ?, ?, ?)",
-            (item_id, page, image_id, ending),
-        )
+        with self.cursor() as cursor:
+            self.execute(
+                cursor,
+                "INSERT INTO images (item_id, page, image_id, ending) VALUES (?, ?, ?, ?)",
+                (item_id, page, image_id, ending),
+            )
 
     def image_exists(
         self, item_id: str, page: int, image_id: str, ending: str = "jpeg"
@@ -147,20 +378,141 @@ class DBHandler:
             (item_id, page, image_id, ending),
         )
 
+    def use_blob_ids(self, index_path: str, chunk_size: int = 1000):
+        # Points images.image_id at the content digests of dataset/blob_store.py
+        index = sqlite3.connect(index_path)
+        try:
+            rows: list = [
+                (digest, item_id, page)
+                for item_id, page, digest in index.execute("SELECT item_id, page, digest FROM refs")
+            ]
+        finally:
+            index.close()
+        with self.cursor() as cursor:
+            for start in range(0, len(rows), chunk_size):
+                self.executemany(
+                    cursor,
+                    "UPDATE images SET image_id = ? WHERE (item_id = ? AND page = ?)",
+                    rows[start : start + chunk_size],
+                )
+        self.notify_ingested([(item_id, page) for _, item_id, page in rows])
+
+    def mark_duplicates(self, groups_path: str) -> int:
+        # Groups exported by dataset/near_duplicates.py, the first image of each stays playable.
+        # Byte-identical images share one blob and never form a group, so pages sharing an
+        # image_id are marked as well, keeping the first, preferably playable, one
+        with open(groups_path, "r") as groups_file:
+            groups: list = json.load(groups_file)
+        image_ids: list = [image_id for group in groups for image_id in group["image_ids"][1:]]
+        keys: typing.Set[typing.Tuple[str, int]] = set()
+        with self.cursor() as cursor:
+            for start in range(0, len(image_ids), 500):
+                chunk: list = image_ids[start : start + 500]
+                placeholders: str = ", ".join(["?"] * len(chunk))
+                self.execute(
+                    cursor,
+                    f"SELECT item_id, page FROM images WHERE image_id IN ({placeholders})",
+                    chunk,
+                )
+                keys.update(cursor.fetchall())
+            self.execute(
+                cursor,
+                "SELECT im.item_id, im.page, im.image_id FROM images im "
+                "JOIN items i ON (i.item_id = im.item_id AND i.page = im.page) "
+                "WHERE im.image_id IN "
+                "(SELECT image_id FROM images GROUP BY image_id HAVING COUNT(*) > 1) "
+                "ORDER BY im.image_id, i.playable DESC, im.item_id, im.page",
+            )
+            kept: typing.Optional[str] = None
+            for item_id, page, shared_id in cursor.fetchall():
+                if shared_id == kept:
+                    keys.add((item_id, page))
+                kept = shared_id
+            ordered: list = sorted(keys)
+            if ordered:
+                self.executemany(
+                    cursor,
+                    "UPDATE items SET playable = 0 WHERE (item_id = ? AND page = ?)", ordered
+                )
+        if ordered:
+            self.notify_unplayable(ordered)
+        return len(ordered)
+
+    def load_derivatives(self, manifest_path: str, chunk_size: int = 1000):
+        # Manifest written by dataset/image_derivatives.py, one JSON object per line
+        statement: str = (
+            "INSERT INTO image_derivatives (image_id, variant, format, width, height, bytes) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON DUPLICATE KEY UPDATE width = VALUES(width), height = VALUES(height), bytes = VALUES(bytes)"
+        )
+        rows: list = []
+        with open(manifest_path, "r") as manifest, self.cursor() as cursor:
+            for line in manifest:
+                record: dict = json.loads(line)
+                rows.append(
+                    (
+                        record["image_id"],
+                        record["variant"],
+                        record["format"],
+                        record["width"],
+                        record["height"],
+                        record["bytes"],
+                    )
+                )
+                if len(rows) >= chunk_size:
+                    self.executemany(cursor, statement, rows)
+                    rows.clear()
+            if rows:
+                self.executemany(cursor, statement, rows)
+
+    def get_derivatives(self, item_id: str, page: int):
+        with self.cursor() as cursor:
+            self.execute(
+                cursor,
+                "SELECT d.variant, d.format, d.width, d.height, d.bytes FROM images i "
+                "JOIN image_derivatives d ON (d.image_id = i.image_id) "
+                "WHERE (i.item_id = ? AND i.page = ?) ORDER BY d.bytes",
+                (item_id, page),
+            )
+            return cursor.fetchall()
+
+    def smallest_derivative(
+        self,
+        item_id: str,
+        page: int,
+        min_width: int,
+        formats: typing.Tuple[str, ...] = ("webp", "jpeg"),
+    ):
+        candidates: list = [
+            row for row in self.get_derivatives(item_id, page) if row[1] in formats
+        ]
+        if not candidates:
+            raise KeyError(f"No derivatives for {item_id}/{page}")
+        # Smallest file that is wide enough, else the widest one there is
+        adequate: list = [row for row in candidates if row[2] >= min_width]
+        if adequate:
+            return adequate[0]
+        return max(candidates, key=lambda row: (row[2], -row[4]))
+
     def delete_all_items(self):
-        cursor = self.connection.cursor()
-        cursor.execute("DELETE FROM items")
+        with self.cursor() as cursor:
+            self.execute(cursor, "DELETE FROM items")
+        self.notify_deleted()
 
     def get_image_id(self, id: str, page: int):
-        unhashed: str = id.strip("/") + "/" + str(page)
-        return self.hasher(unhashed.encode("utf-8")).hexdigest()
+        return image_id(id, page, self.hasher)
 
 
 if __name__ == "__main__":
-    db_config_path: str = "./db_access.json"
-    handler = DBHandler(db_config_path)
+    # Full reload, incremental ingest is "dataset/cli.py ingest"
+    parser = argparse.ArgumentParser(description="Replace all items with the crawl output")
+    parser.add_argument("--config", default="./db_access.json")
+    parser.add_argument("--store", default="./images.sqlite")
+    args = parser.parse_args()
+
+    handler = DBHandler(args.config)
     handler.delete_all_items()
     for id, page in handler.get_ids():
         print(f"{id} - {page}")
 
-    handler.load_from_json("./images.json")
+    handler.load_from_store(args.store, bulk=True)
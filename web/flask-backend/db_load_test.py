@@ -0,0 +1,94 @@
+import argparse
+import random
+import statistics
+import threading
+import time
+import typing
+
+from db_handler import DBHandler
+from item_cache import ItemCache
+
+
+def simulate_request(handler: DBHandler, ids: list, cache: typing.Optional[ItemCache] = None) -> None:
+    # Roughly what serving one round costs: a few point lookups on one connection
+    item_id, page = random.choice(ids)
+    if cache is not None:
+        cache.get(item_id, page)
+        return
+    with handler.connection():
+        handler.item_exists(item_id, page)
+        handler.image_exists(item_id, page, handler.get_image_id(item_id, page))
+        handler.item_citation_exists(item_id, page, "chicago")
+
+
+def run_level(
+    handler: DBHandler,
+    ids: list,
+    concurrency: int,
+    duration: float,
+    cache: typing.Optional[ItemCache] = None,
+) -> dict:
+    latencies: typing.List[float] = []
+    errors: typing.List[int] = [0]
+    lock = threading.Lock()
+    stop_at: float = time.monotonic() + duration
+
+    def worker():
+        local_latencies: list = []
+        local_errors: int = 0
+        while time.monotonic() < stop_at:
+            start: float = time.perf_counter()
+            try:
+                simulate_request(handler, ids, cache)
+            except Exception:
+                local_errors += 1
+                continue
+            local_latencies.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": len(latencies) / duration,
+        "p50": latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+        "p99": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0,
+        "mean": statistics.mean(latencies) * 1000 if latencies else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test DBHandler against a local MariaDB")
+    parser.add_argument("--config", default="./db_access.json")
+    parser.add_argument("--pool-size", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--levels", default="1,2,4,8,16,32")
+    parser.add_argument("--item-cache", type=int, default=0, help="Serve through an ItemCache of this many entries")
+    args = parser.parse_args()
+
+    handler = DBHandler(args.config, pool_size=args.pool_size)
+    ids: list = handler.get_ids()
+    if not ids:
+        raise SystemExit("No items in the database, run an ingest first")
+    cache: typing.Optional[ItemCache] = None
+    if args.item_cache > 0:
+        cache = ItemCache(handler, max_entries=args.item_cache)
+
+    print(f"{'threads':>8} {'requests':>10} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for level in [int(level) for level in args.levels.split(",")]:
+        result: dict = run_level(handler, ids, level, args.duration, cache)
+        print(
+            f"{result['concurrency']:>8} {result['requests']:>10} {result['errors']:>7} "
+            f"{result['rps']:>9.0f} {result['p50']:>8.2f} {result['p99']:>8.2f}"
+        )
+    if cache is not None:
+        print(cache.info())
@@ -0,0 +1,243 @@
+import atexit
+import datetime
+import threading
+import time
+import typing
+
+from db_handler import DBHandler
+from guess_stats import GuessStats
+
+
+class EventRecorder:
+    handler: DBHandler
+    flush_interval: float
+    flush_size: int
+    max_pending: int
+
+    def __init__(
+        self,
+        handler: DBHandler,
+        flush_interval: float = 1.0,
+        flush_size: int = 500,
+        max_pending: int = 50000,
+        guess_stats: typing.Optional[GuessStats] = None,
+        max_retries: int = 5,
+    ) -> None:
+        self.handler = handler
+        # Summary tables updated in the same transaction as the guesses
+        self.guess_stats = guess_stats
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        # Upper bound on events held in memory, anything beyond is dropped and counted
+        self.max_pending = max_pending
+        # Failed flushes in a row before the pending events are given up on
+        self.max_retries = max_retries
+        self.failed_attempts: int = 0
+        self.condition = threading.Condition()
+        self.flush_lock = threading.Lock()
+        self.guesses: typing.List[tuple] = []
+        self.counters: typing.Dict[typing.Tuple[str, int], typing.List[int]] = {}
+        self.pending: int = 0
+        self.closed: bool = False
+        self.stats: typing.Dict[str, float] = {
+            "recorded": 0,
+            "dropped": 0,
+            "flushed": 0,
+            "flushes": 0,
+            "flush_errors": 0,
+            "rejected": 0,
+            "abandoned": 0,
+            "last_flush_seconds": 0.0,
+            "max_flush_seconds": 0.0,
+            "total_flush_seconds": 0.0,
+        }
+        self.thread = threading.Thread(target=self.run, name="event-recorder", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def enqueue(self, add: typing.Callable[[], None]) -> bool:
+        with self.condition:
+            if self.closed or self.pending >= self.max_pending:
+                self.stats["dropped"] += 1
+                return False
+            add()
+            self.pending += 1
+            self.stats["recorded"] += 1
+            if self.pending >= self.flush_size:
+                self.condition.notify()
+            return True
+
+    def record_guess(
+        self,
+        item_id: str,
+        page: int,
+        guess: int,
+        when: typing.Optional[datetime.datetime] = None,
+    ) -> bool:
+        if when is None:
+            when = datetime.datetime.now()
+        return self.enqueue(lambda: self.guesses.append((item_id, page, guess, when)))
+
+    def count(self, item_id: str, page: int, column: int) -> None:
+        counter: typing.List[int] = self.counters.setdefault((item_id, page), [0, 0])
+        counter[column] += 1
+
+    def record_view(self, item_id: str, page: int) -> bool:
+        return self.enqueue(lambda: self.count(item_id, page, 0))
+
+    def record_skip(self, item_id: str, page: int) -> bool:
+        return self.enqueue(lambda: self.count(item_id, page, 1))
+
+    def run(self) -> None:
+        while True:
+            with self.condition:
+                if not self.closed and self.pending < self.flush_size:
+                    self.condition.wait(self.flush_interval)
+                if self.closed:
+                    return
+            try:
+                self.flush()
+            except Exception as ex:
+                print(f"Exception occured while flushing events: {ex}")
+
+    def take(self) -> typing.Tuple[list, dict, int]:
+        with self.condition:
+            guesses, counters, pending = self.guesses, self.counters, self.pending
+            self.guesses, self.counters, self.pending = [], {}, 0
+        return guesses, counters, pending
+
+    def requeue(self, guesses: list, counters: dict, pending: int) -> None:
+        with self.condition:
+            self.guesses = guesses + self.guesses
+            for key, (views, skips) in counters.items():
+                counter: typing.List[int] = self.counters.setdefault(key, [0, 0])
+                counter[0] += views
+                counter[1] += skips
+            self.pending += pending
+
+    def events(self, guesses: list, counters: dict) -> typing.List[tuple]:
+        return [("guess", guess) for guess in guesses] + [
+            ("counts", key, views, skips) for key, (views, skips) in counters.items()
+        ]
+
+    def split(self, events: typing.List[tuple]) -> typing.Tuple[list, dict, int]:
+        # Back to what write() and requeue() take, with the number of events covered
+        guesses: list = []
+        counters: dict = {}
+        pending: int = 0
+        for event in events:
+            if event[0] == "guess":
+                guesses.append(event[1])
+                pending += 1
+            else:
+                counters[event[1]] = [event[2], event[3]]
+                pending += event[2] + event[3]
+        return guesses, counters, pending
+
+    def isolate(
+        self, events: typing.List[tuple]
+    ) -> typing.Tuple[int, typing.List[tuple], typing.Optional[Exception]]:
+        # Writes what it can, bisecting on integrity errors so only the offending events are
+        # dropped. Returns (rejected events, events left unwritten, transient error)
+        guesses, counters, pending = self.split(events)
+        try:
+            self.write(guesses, counters)
+            return 0, [], None
+        except self.handler.integrity_errors as ex:
+            if len(events) == 1:
+                print(f"Dropping event rejected by the database {events[0]}: {ex}")
+                return pending, [], None
+        except Exception as ex:
+            return 0, events, ex
+        middle: int = len(events) // 2
+        rejected, unwritten, error = self.isolate(events[:middle])
+        if error is not None:
+            return rejected, unwritten + events[middle:], error
+        right_rejected, unwritten, error = self.isolate(events[middle:])
+        return rejected + right_rejected, unwritten, error
+
+    def flush(self) -> int:
+        with self.flush_lock:
+            guesses, counters, pending = self.take()
+            if not pending:
+                return 0
+            start: float = time.perf_counter()
+            rejected, unwritten, error = self.isolate(self.events(guesses, counters))
+            if error is not None:
+                unwritten_guesses, unwritten_counters, unwritten_pending = self.split(unwritten)
+                self.failed_attempts += 1
+                with self.condition:
+                    self.stats["flush_errors"] += 1
+                    self.stats["rejected"] += rejected
+                    self.stats["flushed"] += pending - rejected - unwritten_pending
+                    if self.failed_attempts >= self.max_retries:
+                        self.stats["abandoned"] += unwritten_pending
+                if self.failed_attempts >= self.max_retries:
+                    # Keeps a persistent failure from holding the queue forever
+                    self.failed_attempts = 0
+                else:
+                    self.requeue(unwritten_guesses, unwritten_counters, unwritten_pending)
+                raise error
+            self.failed_attempts = 0
+            elapsed: float = time.perf_counter() - start
+            with self.condition:
+                self.stats["rejected"] += rejected
+                self.stats["flushed"] += pending - rejected
+                self.stats["flushes"] += 1
+                self.stats["last_flush_seconds"] = elapsed
+                self.stats["max_flush_seconds"] = max(self.stats["max_flush_seconds"], elapsed)
+                self.stats["total_flush_seconds"] += elapsed
+            return pending - rejected
+
+    def write(self, guesses: list, counters: dict) -> None:
+        # Sorted so concurrent flushers lock stats rows in the same order
+        stats_rows: list = [
+            (item_id, page, views, skips)
+            for (item_id, page), (views, skips) in sorted(counters.items())
+        ]
+        with self.handler.connection() as connection, self.handler.cursor() as cursor:
+            connection.autocommit = False
+            try:
+                if guesses:
+                    self.handler.executemany(
+                        cursor,
+                        "INSERT INTO guesses (item_id, page, guess, datetime) VALUES (?, ?, ?, ?)",
+                        guesses,
+                    )
+                    if self.guess_stats is not None:
+                        self.guess_stats.apply(cursor, guesses)
+                if stats_rows:
+                    self.handler.executemany(
+                        cursor,
+                        "INSERT INTO stats (item_id, page, views, skips) VALUES (?, ?, ?, ?) "
+                        "ON DUPLICATE KEY UPDATE views = views + VALUES(views), skips = skips + VALUES(skips)",
+                        stats_rows,
+                    )
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                connection.autocommit = True
+
+    def close(self, timeout: float = 5.0) -> None:
+        with self.condition:
+            if self.closed:
+                return
+            self.closed = True
+            self.condition.notify()
+        self.thread.join(timeout)
+        # Final drain, events still pending after this are lost
+        try:
+            self.flush()
+        except Exception as ex:
+            print(f"Exception occured while flushing events on shutdown: {ex}")
+
+    def metrics(self) -> typing.Dict[str, float]:
+        with self.condition:
+            metrics: typing.Dict[str, float] = dict(self.stats)
+            metrics["queue_depth"] = self.pending
+        metrics["mean_flush_seconds"] = (
+            metrics["total_flush_seconds"] / metrics["flushes"] if metrics["flushes"] else 0.0
+        )
+        return metrics
@@ -0,0 +1,271 @@
+import argparse
+import contextlib
+import math
+import typing
+
+from db_handler import DBHandler
+
+# Lower bounds in years of the absolute error buckets, each has a column errors_<bound>
+ERROR_BUCKETS: typing.Tuple[int, ...] = (0, 1, 3, 6, 11, 26, 51)
+COLUMNS: typing.Tuple[str, ...] = (
+    "guess_count",
+    "guess_sum",
+    "guess_sum_squares",
+    "error_sum",
+    "abs_error_sum",
+    "error_sum_squares",
+) + tuple(f"errors_{bound}" for bound in ERROR_BUCKETS)
+
+
+def error_bucket(error: int) -> int:
+    error = abs(error)
+    bucket: int = 0
+    for index, bound in enumerate(ERROR_BUCKETS):
+        if error >= bound:
+            bucket = index
+    return bucket
+
+
+class GuessAggregate:
+    __slots__ = (
+        "guess_count",
+        "guess_sum",
+        "guess_sum_squares",
+        "error_sum",
+        "abs_error_sum",
+        "error_sum_squares",
+        "histogram",
+    )
+
+    def __init__(self) -> None:
+        self.guess_count = 0
+        self.guess_sum = 0
+        self.guess_sum_squares = 0
+        self.error_sum = 0
+        self.abs_error_sum = 0
+        self.error_sum_squares = 0
+        self.histogram: typing.List[int] = [0] * len(ERROR_BUCKETS)
+
+    def add(self, guess: int, year: int) -> None:
+        error: int = guess - year
+        self.guess_count += 1
+        self.guess_sum += guess
+        self.guess_sum_squares += guess * guess
+        self.error_sum += error
+        self.abs_error_sum += abs(error)
+        self.error_sum_squares += error * error
+        self.histogram[error_bucket(error)] += 1
+
+    def values(self) -> tuple:
+        return (
+            self.guess_count,
+            self.guess_sum,
+            self.guess_sum_squares,
+            self.error_sum,
+            self.abs_error_sum,
+            self.error_sum_squares,
+        ) + tuple(self.histogram)
+
+    @staticmethod
+    def summary(row: typing.Sequence[int]) -> dict:
+        # Works from a stored row, so reads never touch the guesses table
+        count, guess_sum, guess_squares, error_sum, abs_error_sum, error_squares = row[:6]
+        if not count:
+            return {"guesses": 0}
+        mean_guess: float = guess_sum / count
+        return {
+            "guesses": count,
+            "mean_guess": mean_guess,
+            "guess_stddev": math.sqrt(max(guess_squares / count - mean_guess ** 2, 0.0)),
+            "mean_error": error_sum / count,
+            "mean_abs_error": abs_error_sum / count,
+            "rms_error": math.sqrt(error_squares / count),
+            "histogram": {
+                bound: int(row[6 + index]) for index, bound in enumerate(ERROR_BUCKETS)
+            },
+        }
+
+
+class GuessStats:
+    handler: DBHandler
+    item_table: str = "guess_stats_items"
+    decade_table: str = "guess_stats_decades"
+
+    def __init__(self, handler: DBHandler, chunk_size: int = 500) -> None:
+        self.handler = handler
+        self.chunk_size = chunk_size
+
+    def upsert_statement(self, table: str, keys: typing.Tuple[str, ...]) -> str:
+        columns: tuple = keys + COLUMNS
+        return (
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join(['?'] * len(columns))}) "
+            "ON DUPLICATE KEY UPDATE "
+            + ", ".join(f"{column} = {column} + VALUES({column})" for column in COLUMNS)
+        )
+
+    def years(self, cursor, keys: typing.List[typing.Tuple[str, int]]) -> typing.Dict[tuple, int]:
+        years: typing.Dict[tuple, int] = {}
+        for start in range(0, len(keys), self.chunk_size):
+            chunk: list = keys[start : start + self.chunk_size]
+            placeholders: str = ", ".join(["(?, ?)"] * len(chunk))
+            self.handler.execute(
+                cursor,
+                "SELECT item_id, page, YEAR(date) FROM items "
+                f"WHERE date IS NOT NULL AND (item_id, page) IN ({placeholders})",
+                [value for key in chunk for value in key],
+            )
+            for item_id, page, year in cursor.fetchall():
+                years[(item_id, page)] = year
+        return years
+
+    def aggregate(
+        self,
+        guesses: typing.Iterable[tuple],
+        years: typing.Dict[tuple, int],
+        items: typing.Optional[typing.Dict[tuple, GuessAggregate]] = None,
+        decades: typing.Optional[typing.Dict[int, GuessAggregate]] = None,
+    ) -> typing.Tuple[typing.Dict[tuple, GuessAggregate], typing.Dict[int, GuessAggregate]]:
+        items = {} if items is None else items
+        decades = {} if decades is None else decades
+        for item_id, page, guess, *_ in guesses:
+            year: typing.Optional[int] = years.get((item_id, page))
+            if year is None:
+                # Undated items have nothing to be wrong about
+                continue
+            if (item_id, page) not in items:
+                items[(item_id, page)] = GuessAggregate()
+            items[(item_id, page)].add(guess, year)
+            decade: int = year // 10 * 10
+            if decade not in decades:
+                decades[decade] = GuessAggregate()
+            decades[decade].add(guess, year)
+        return items, decades
+
+    def write(
+        self,
+        cursor,
+        items: typing.Dict[tuple, GuessAggregate],
+        decades: typing.Dict[int, GuessAggregate],
+    ) -> None:
+        # Sorted so concurrent writers lock summary rows in the same order
+        item_rows: list = [key + aggregate.values() for key, aggregate in sorted(items.items())]
+        decade_rows: list = [
+            (decade,) + aggregate.values() for decade, aggregate in sorted(decades.items())
+        ]
+        for start in range(0, len(item_rows), self.chunk_size):
+            self.handler.executemany(
+                cursor,
+                self.upsert_statement(self.item_table, ("item_id", "page")),
+                item_rows[start : start + self.chunk_size],
+            )
+        if decade_rows:
+            self.handler.executemany(
+                cursor, self.upsert_statement(self.decade_table, ("decade",)), decade_rows
+            )
+
+    def apply(self, cursor, guesses: typing.List[tuple]) -> None:
+        # Called by EventRecorder inside the transaction that inserts the guesses
+        keys: list = sorted({(guess[0], guess[1]) for guess in guesses})
+        items, decades = self.aggregate(guesses, self.years(cursor, keys))
+        self.write(cursor, items, decades)
+
+    def rebuild(self, chunk_size: int = 10000, recorder=None) -> int:
+        # Streams guesses joined with their year, then replaces both summaries at once.
+        # Deltas applied between the read and the replace would be lost, so the recorder
+        # (an EventRecorder) of this process is drained and held off until the new summaries
+        # are in. Other processes recording guesses have to be stopped for the rebuild
+        if recorder is not None:
+            recorder.flush()
+        with recorder.flush_lock if recorder is not None else contextlib.nullcontext():
+            items: typing.Dict[tuple, GuessAggregate] = {}
+            decades: typing.Dict[int, GuessAggregate] = {}
+            streamed: int = 0
+            with self.handler.cursor(buffered=False) as cursor:
+                self.handler.execute(
+                    cursor,
+                    "SELECT g.item_id, g.page, g.guess, YEAR(i.date) FROM guesses g "
+                    "JOIN items i ON (i.item_id = g.item_id AND i.page = g.page) "
+                    "WHERE i.date IS NOT NULL",
+                )
+                while True:
+                    rows: list = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    years: dict = {(item_id, page): year for item_id, page, _, year in rows}
+                    self.aggregate(rows, years, items, decades)
+                    streamed += len(rows)
+                    print(f"Aggregated {streamed} guesses")
+            with self.handler.connection() as connection, self.handler.cursor() as cursor:
+                connection.autocommit = False
+                try:
+                    self.handler.execute(cursor, f"DELETE FROM {self.item_table}")
+                    self.handler.execute(cursor, f"DELETE FROM {self.decade_table}")
+                    self.write(cursor, items, decades)
+                    connection.commit()
+                except Exception:
+                    connection.rollback()
+                    raise
+                finally:
+                    connection.autocommit = True
+            return streamed
+
+    def item(self, item_id: str, page: int) -> dict:
+        with self.handler.cursor() as cursor:
+            self.handler.execute(
+                cursor,
+                f"SELECT {', '.join(COLUMNS)} FROM {self.item_table} WHERE (item_id = ? AND page = ?)",
+                (item_id, page),
+            )
+            row: typing.Optional[tuple] = cursor.fetchone()
+        return GuessAggregate.summary(row) if row is not None else {"guesses": 0}
+
+    def decade(self, decade: int) -> dict:
+        with self.handler.cursor() as cursor:
+            self.handler.execute(
+                cursor,
+                f"SELECT {', '.join(COLUMNS)} FROM {self.decade_table} WHERE decade = ?",
+                (decade,),
+            )
+            row: typing.Optional[tuple] = cursor.fetchone()
+        return GuessAggregate.summary(row) if row is not None else {"guesses": 0}
+
+    def decades(self) -> typing.Dict[int, dict]:
+        with self.handler.cursor() as cursor:
+            self.handler.execute(
+                cursor, f"SELECT decade, {', '.join(COLUMNS)} FROM {self.decade_table} ORDER BY decade"
+            )
+            return {row[0]: GuessAggregate.summary(row[1:]) for row in cursor.fetchall()}
+
+    def hardest(self, limit: int = 10, min_guesses: int = 10) -> typing.List[tuple]:
+        # Items people are furthest off on, (item_id, page, guesses, mean absolute error)
+        with self.handler.cursor() as cursor:
+            self.handler.execute(
+                cursor,
+                f"SELECT item_id, page, guess_count, abs_error_sum / guess_count AS mean_abs_error "
+                f"FROM {self.item_table} WHERE guess_count >= ? "
+                "ORDER BY mean_abs_error DESC LIMIT ?",
+                (min_guesses, limit),
+            )
+            return cursor.fetchall()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the guess summary tables")
+    parser.add_argument("command", choices=["rebuild", "decades", "hardest"])
+    parser.add_argument("--config", default="./db_access.json")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--min-guesses", type=int, default=10)
+    args = parser.parse_args()
+
+    stats = GuessStats(DBHandler(args.config))
+    if args.command == "rebuild":
+        # No recorder here, run it while the app is stopped
+        print(f"Rebuilt summaries from {stats.rebuild(args.chunk_size)} guesses")
+    elif args.command == "decades":
+        for decade, summary in stats.decades().items():
+            print(f"{decade}s: {summary}")
+    elif args.command == "hardest":
+        for item_id, page, count, error in stats.hardest(args.limit, args.min_guesses):
+            print(f"{item_id} - {page}: {float(error):.1f} years off over {count} guesses")
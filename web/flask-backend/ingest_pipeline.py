@@ -0,0 +1,271 @@
+import argparse
+import json
+import queue
+import sqlite3
+import threading
+import time
+import typing
+import zlib
+
+from db_handler import DBHandler, image_id, page_rows
+
+# Marks the end of a queue, one per consumer
+DONE = None
+
+
+def stream_pages(path: str) -> typing.Iterator[typing.Tuple[str, str, str, typing.Any]]:
+    # Crawl output as (collection, item, page, entry), entry is still JSON text for stores
+    if path.endswith(".json"):
+        with open(path, "r") as json_file:
+            input_dict: dict = json.load(json_file)
+        for collection_index in input_dict:
+            for item_index in input_dict[collection_index]:
+                for page_index in input_dict[collection_index][item_index]:
+                    yield (
+                        collection_index,
+                        item_index,
+                        page_index,
+                        input_dict[collection_index][item_index][page_index],
+                    )
+        return
+    store = sqlite3.connect(path)
+    try:
+        yield from store.execute(
+            "SELECT collection, item_id, page, data FROM pages ORDER BY collection, item_id, page"
+        )
+    finally:
+        store.close()
+
+
+class IngestPipeline:
+    handler: typing.Optional[DBHandler]
+    stages: typing.Tuple[str, ...] = ("parse", "transform", "write")
+
+    def __init__(
+        self,
+        handler: typing.Optional[DBHandler],
+        writers: int = 4,
+        batch_size: int = 500,
+        queue_size: int = 8,
+        retries: int = 3,
+        progress_interval: float = 2.0,
+    ) -> None:
+        # Without a handler nothing is written and only stage throughput is measured
+        self.handler = handler
+        self.dry_run = handler is None
+        self.writers = writers
+        self.batch_size = batch_size
+        self.retries = retries
+        self.progress_interval = progress_interval
+        self.get_image_id = handler.get_image_id if handler is not None else image_id
+        self.parsed: queue.Queue = queue.Queue(maxsize=queue_size)
+        # One queue per writer, a collection always goes to the same writer
+        self.transformed: typing.List[queue.Queue] = [
+            queue.Queue(maxsize=queue_size) for _ in range(writers)
+        ]
+        self.lock = threading.Lock()
+        self.errors: typing.List[Exception] = []
+        # Set when any stage dies, so the others stop instead of blocking on a full queue
+        self.stopped = threading.Event()
+        self.stats: typing.Dict[str, dict] = {
+            stage: {"pages": 0, "busy_seconds": 0.0} for stage in self.stages
+        }
+        self.stats["transform"]["skipped"] = 0
+        self.stats["write"]["failed"] = 0
+
+    def record(self, stage: str, pages: int, seconds: float, **counters: int) -> None:
+        with self.lock:
+            self.stats[stage]["pages"] += pages
+            self.stats[stage]["busy_seconds"] += seconds
+            for counter, amount in counters.items():
+                self.stats[stage][counter] += amount
+
+    def fail(self, ex: Exception) -> None:
+        self.errors.append(ex)
+        self.stopped.set()
+
+    def put(self, target: queue.Queue, task: typing.Any) -> bool:
+        while not self.stopped.is_set():
+            try:
+                target.put(task, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(self, source: queue.Queue) -> typing.Any:
+        while not self.stopped.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return DONE
+
+    def parse(self, path: str) -> None:
+        # Batches never span collections, so writers can be picked per collection
+        try:
+            batch: list = []
+            collection: typing.Optional[str] = None
+            start: float = time.perf_counter()
+            for collection_index, item_index, page_index, entry in stream_pages(path):
+                current: str = collection_index.strip("/")
+                if batch and (current != collection or len(batch) >= self.batch_size):
+                    self.record("parse", len(batch), time.perf_counter() - start)
+                    if not self.put(self.parsed, (collection, batch)):
+                        return
+                    batch = []
+                    start = time.perf_counter()
+                collection = current
+                batch.append((item_index.strip("/"), int(page_index), entry))
+            if batch:
+                self.record("parse", len(batch), time.perf_counter() - start)
+                self.put(self.parsed, (collection, batch))
+        except Exception as ex:
+            self.fail(ex)
+        finally:
+            self.put(self.parsed, DONE)
+
+    def transform(self) -> None:
+        try:
+            while True:
+                task: typing.Optional[tuple] = self.get(self.parsed)
+                if task is DONE:
+                    break
+                start: float = time.perf_counter()
+                collection, batch = task
+                rows: typing.Dict[str, list] = {table: [] for table in DBHandler.bulk_statements}
+                rows["collections"].append((collection,))
+                skipped: int = 0
+                for item, page, entry in batch:
+                    try:
+                        if isinstance(entry, str):
+                            entry = json.loads(entry)
+                        page_rows(rows, collection, item, page, entry, self.get_image_id(item, page))
+                    except (KeyError, ValueError, TypeError) as ex:
+                        skipped += 1
+                        print(f"Skipping {collection} - {item} - {page}: {ex}")
+                self.record(
+                    "transform", len(batch) - skipped, time.perf_counter() - start, skipped=skipped
+                )
+                writer: int = zlib.crc32(collection.encode("utf-8")) % self.writers
+                if not self.put(self.transformed[writer], rows):
+                    return
+        except Exception as ex:
+            self.fail(ex)
+        finally:
+            for writer_queue in self.transformed:
+                self.put(writer_queue, DONE)
+
+    def write_rows(self, rows: typing.Dict[str, list]) -> None:
+        with self.handler.connection() as connection:
+            connection.autocommit = False
+            try:
+                # flush_bulk_rows empties the lists it is given, keep ours for a retry
+                self.handler.flush_bulk_rows({table: list(values) for table, values in rows.items()})
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                connection.autocommit = True
+
+    def write(self, index: int) -> None:
+        writer_queue: queue.Queue = self.transformed[index]
+        try:
+            while True:
+                rows: typing.Optional[dict] = self.get(writer_queue)
+                if rows is DONE:
+                    return
+                pages: int = len(rows["items"])
+                start: float = time.perf_counter()
+                if self.dry_run:
+                    self.record("write", pages, time.perf_counter() - start)
+                    continue
+                for attempt in range(self.retries):
+                    try:
+                        self.write_rows(rows)
+                        self.record("write", pages, time.perf_counter() - start)
+                        break
+                    except Exception as ex:
+                        # Items shared between collections can deadlock concurrent writers
+                        print(f"Exception occured while writing {pages} pages (attempt {attempt + 1}): {ex}")
+                        time.sleep(0.1 * 2 ** attempt)
+                else:
+                    print(f"Giving up on {pages} pages after {self.retries} attempts")
+                    self.record("write", 0, time.perf_counter() - start, failed=pages)
+        except Exception as ex:
+            self.fail(ex)
+
+    def queue_depths(self) -> str:
+        return f"parsed {self.parsed.qsize()}, transformed {sum(q.qsize() for q in self.transformed)}"
+
+    def report(self, start: float) -> None:
+        elapsed: float = time.perf_counter() - start
+        with self.lock:
+            counts: str = ", ".join(f"{stage} {self.stats[stage]['pages']}" for stage in self.stages)
+            written: int = self.stats["write"]["pages"]
+        print(
+            f"{elapsed:.1f}s: {counts} pages ({written / elapsed if elapsed else 0.0:.0f} pages/s), "
+            f"queued {self.queue_depths()}"
+        )
+
+    def run(self, path: str) -> typing.Dict[str, dict]:
+        threads: typing.List[threading.Thread] = [
+            threading.Thread(target=self.parse, args=(path,), name="ingest-parse"),
+            threading.Thread(target=self.transform, name="ingest-transform"),
+        ] + [
+            threading.Thread(target=self.write, args=(index,), name=f"ingest-write-{index}")
+            for index in range(self.writers)
+        ]
+        start: float = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        while True:
+            alive: list = [thread for thread in threads if thread.is_alive()]
+            if not alive:
+                break
+            alive[0].join(self.progress_interval)
+            self.report(start)
+        elapsed: float = time.perf_counter() - start
+        if self.errors:
+            raise self.errors[0]
+
+        for stage in self.stages:
+            stats: dict = self.stats[stage]
+            # Busy time excludes waiting on queues, so this is what the stage alone could sustain
+            stats["pages_per_second"] = (
+                stats["pages"] / stats["busy_seconds"] if stats["busy_seconds"] else 0.0
+            )
+            if self.dry_run and stage == "write":
+                print(f"{stage:>9}: {stats['pages']} pages, not written (dry run)")
+                continue
+            print(
+                f"{stage:>9}: {stats['pages']} pages, {stats['busy_seconds']:.1f}s busy, "
+                f"{stats['pages_per_second']:.0f} pages/s"
+            )
+        failed: int = self.stats["write"]["failed"]
+        print(f"Ingested {self.stats['write']['pages']} pages in {elapsed:.1f}s, {failed} failed")
+        return self.stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipelined ingest of the crawl output")
+    parser.add_argument("source", nargs="?", default="./images.sqlite", help="Checkpoint store or images.json")
+    parser.add_argument("--config", default="./db_access.json")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--progress-interval", type=float, default=2.0)
+    parser.add_argument("--dry-run", action="store_true", help="Parse and transform only, report stage throughput")
+    args = parser.parse_args()
+
+    handler: typing.Optional[DBHandler] = None
+    if not args.dry_run:
+        # One connection per writer plus one spare for listeners
+        handler = DBHandler(args.config, pool_size=args.writers + 1)
+    stats: typing.Dict[str, dict] = IngestPipeline(
+        handler,
+        writers=args.writers,
+        batch_size=args.batch_size,
+        progress_interval=args.progress_interval,
+    ).run(args.source)
+    if stats["write"]["failed"]:
+        raise SystemExit(f"{stats['write']['failed']} pages could not be written")
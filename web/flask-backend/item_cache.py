@@ -0,0 +1,223 @@
+import collections
+import datetime
+import threading
+import time
+import typing
+
+from db_handler import DBHandler
+
+
+class ItemRecord(typing.NamedTuple):
+    item_id: str
+    page: int
+    date: typing.Optional[datetime.date]
+    date_raw: typing.Optional[str]
+    playable: bool
+    image_id: typing.Optional[str]
+    ending: typing.Optional[str]
+    citations: typing.Dict[str, str]
+
+
+class ItemCache:
+    handler: DBHandler
+    query: str = (
+        "SELECT i.item_id, i.page, i.date, i.date_raw, i.playable, im.image_id, im.ending, "
+        "c.style, c.citation "
+        "FROM items i "
+        "LEFT JOIN images im ON (im.item_id = i.item_id AND im.page = i.page) "
+        "LEFT JOIN cite_as c ON (c.item_id = i.item_id AND c.page = i.page)"
+    )
+
+    def __init__(
+        self,
+        handler: DBHandler,
+        max_entries: int = 10000,
+        ttl: typing.Optional[float] = 600.0,
+        chunk_size: int = 500,
+    ) -> None:
+        self.handler = handler
+        self.max_entries = max_entries
+        # None keeps entries until evicted or invalidated
+        self.ttl = ttl
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+        # (item_id, page) -> (loaded at, record), least recently used first
+        self.entries: "collections.OrderedDict[typing.Tuple[str, int], tuple]" = (
+            collections.OrderedDict()
+        )
+        # Keys being read from the database -> readers, and those invalidated meanwhile
+        self.loading: typing.Dict[typing.Tuple[str, int], int] = {}
+        self.stale: typing.Set[typing.Tuple[str, int]] = set()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+        handler.add_listener(self)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def count(self, result: str, amount: int = 1) -> None:
+        if self.handler.metrics is not None and amount:
+            self.handler.metrics.inc("item_cache_lookups_total", amount, result=result)
+
+    def cached(self, key: typing.Tuple[str, int]) -> typing.Optional[ItemRecord]:
+        # Caller holds the lock
+        entry: typing.Optional[tuple] = self.entries.get(key)
+        if entry is None:
+            return None
+        loaded, record = entry
+        if self.ttl is not None and time.monotonic() - loaded > self.ttl:
+            del self.entries[key]
+            self.expirations += 1
+            return None
+        self.entries.move_to_end(key)
+        return record
+
+    def store(self, key: typing.Tuple[str, int], record: ItemRecord) -> None:
+        # Caller holds the lock
+        self.entries[key] = (time.monotonic(), record)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def put(self, record: ItemRecord) -> None:
+        with self.lock:
+            self.store((record.item_id, record.page), record)
+
+    def begin(self, keys: typing.List[typing.Tuple[str, int]]) -> None:
+        with self.lock:
+            for key in keys:
+                self.loading[key] = self.loading.get(key, 0) + 1
+
+    def finish(
+        self, keys: typing.List[typing.Tuple[str, int]], records: typing.Dict[tuple, ItemRecord]
+    ) -> None:
+        # An invalidation that landed during the read means the rows may predate the
+        # change, so they are returned to the caller but never cached
+        with self.lock:
+            for key in keys:
+                if key in records and key not in self.stale:
+                    self.store(key, records[key])
+                self.loading[key] -= 1
+                if not self.loading[key]:
+                    del self.loading[key]
+                    self.stale.discard(key)
+
+    def assemble(self, rows: typing.Iterable[tuple]) -> typing.Dict[tuple, ItemRecord]:
+        # One row per citation style, folded into one record per (item_id, page)
+        records: typing.Dict[tuple, ItemRecord] = {}
+        for item_id, page, date, date_raw, playable, image_id, ending, style, citation in rows:
+            key: tuple = (item_id, page)
+            if key not in records:
+                records[key] = ItemRecord(
+                    item_id, page, date, date_raw, bool(playable), image_id, ending, {}
+                )
+            if style is not None:
+                records[key].citations[style] = citation
+        return records
+
+    def load(self, keys: typing.List[typing.Tuple[str, int]]) -> typing.Dict[tuple, ItemRecord]:
+        records: typing.Dict[tuple, ItemRecord] = {}
+        self.begin(keys)
+        try:
+            for start in range(0, len(keys), self.chunk_size):
+                chunk: list = keys[start : start + self.chunk_size]
+                placeholders: str = ", ".join(["(?, ?)"] * len(chunk))
+                parameters: list = [value for key in chunk for value in key]
+                with self.handler.cursor() as cursor:
+                    self.handler.execute(
+                        cursor,
+                        f"{self.query} WHERE (i.item_id, i.page) IN ({placeholders})",
+                        parameters,
+                    )
+                    records.update(self.assemble(cursor.fetchall()))
+        finally:
+            self.finish(keys, records)
+        return records
+
+    def get(self, item_id: str, page: int) -> ItemRecord:
+        key: tuple = (item_id, page)
+        with self.lock:
+            record: typing.Optional[ItemRecord] = self.cached(key)
+            if record is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if record is not None:
+            self.count("hit")
+            return record
+        self.count("miss")
+        records: dict = {}
+        self.begin([key])
+        try:
+            with self.handler.cursor() as cursor:
+                self.handler.execute(
+                    cursor, f"{self.query} WHERE (i.item_id = ? AND i.page = ?)", key
+                )
+                records = self.assemble(cursor.fetchall())
+        finally:
+            self.finish([key], records)
+        if key not in records:
+            raise KeyError(f"No item {item_id}/{page}")
+        return records[key]
+
+    def get_many(
+        self, keys: typing.Iterable[typing.Tuple[str, int]]
+    ) -> typing.Dict[typing.Tuple[str, int], ItemRecord]:
+        # Missing items are left out of the result rather than raising
+        found: typing.Dict[tuple, ItemRecord] = {}
+        missing: list = []
+        with self.lock:
+            for key in keys:
+                record: typing.Optional[ItemRecord] = self.cached(key)
+                if record is not None:
+                    found[key] = record
+                else:
+                    missing.append(key)
+            self.hits += len(found)
+            self.misses += len(missing)
+        self.count("hit", len(found))
+        self.count("miss", len(missing))
+        if missing:
+            found.update(self.load(missing))
+        return found
+
+    def invalidate(self, keys: typing.Iterable[typing.Tuple[str, int]]) -> None:
+        with self.lock:
+            for key in keys:
+                if key in self.loading:
+                    self.stale.add(key)
+                if self.entries.pop(key, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+            self.stale.update(self.loading)
+
+    def items_ingested(self, keys: typing.List[typing.Tuple[str, int]]) -> None:
+        self.invalidate(keys)
+
+    def items_deleted(self) -> None:
+        self.clear()
+
+    def items_unplayable(self, keys: typing.List[typing.Tuple[str, int]]) -> None:
+        self.invalidate(keys)
+
+    def info(self) -> dict:
+        with self.lock:
+            lookups: int = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
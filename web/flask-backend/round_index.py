@@ -0,0 +1,183 @@
+import array
+import random
+import threading
+import typing
+
+from db_handler import DBHandler
+
+
+class RoundIndex:
+    handler: DBHandler
+    query: str = (
+        "SELECT i.item_id, i.page, im.image_id, YEAR(i.date), ci.collection_id "
+        "FROM items i "
+        "JOIN images im ON (im.item_id = i.item_id AND im.page = i.page) "
+        "LEFT JOIN collection_items ci ON (ci.item_id = i.item_id AND ci.page = i.page) "
+        "WHERE i.date IS NOT NULL AND i.playable = 1"
+    )
+
+    state: typing.Tuple[str, ...] = (
+        "item_ids",
+        "pages",
+        "image_ids",
+        "years",
+        "positions",
+        "buckets",
+        "memberships",
+    )
+
+    def __init__(self, handler: DBHandler, chunk_size: int = 500, listen: bool = True) -> None:
+        self.handler = handler
+        self.chunk_size = chunk_size
+        self.lock = threading.RLock()
+        # One rebuild at a time, keys ingested while it runs are replayed after the swap
+        self.rebuild_lock = threading.Lock()
+        self.rebuild_ingested: typing.Optional[list] = None
+        self.clear()
+        if listen:
+            handler.add_listener(self)
+
+    def clear(self) -> None:
+        with self.lock:
+            # Parallel arrays, one slot per playable (item_id, page)
+            self.item_ids: typing.List[str] = []
+            self.pages: array.array = array.array("i")
+            self.image_ids: typing.List[str] = []
+            self.years: array.array = array.array("h")
+            self.positions: typing.Dict[typing.Tuple[str, int], int] = {}
+            # Bucket key -> slots, (collection, decade) with None as wildcard
+            self.buckets: typing.Dict[tuple, array.array] = {(None, None): array.array("I")}
+            self.memberships: typing.Set[typing.Tuple[int, str]] = set()
+
+    def __len__(self) -> int:
+        return len(self.item_ids)
+
+    def add_to_bucket(self, key: tuple, position: int) -> None:
+        if key not in self.buckets:
+            self.buckets[key] = array.array("I")
+        self.buckets[key].append(position)
+
+    def move_decade(self, position: int, previous: int, decade: int) -> None:
+        # Rare, only for a corrected date, so scanning the old buckets is fine
+        for key in [key for key in self.buckets if key[1] == previous]:
+            bucket: array.array = self.buckets[key]
+            if position in bucket:
+                bucket.remove(position)
+                self.add_to_bucket((key[0], decade), position)
+
+    def add(
+        self,
+        item_id: str,
+        page: int,
+        image_id: str,
+        year: int,
+        collection: typing.Optional[str] = None,
+    ) -> None:
+        with self.lock:
+            decade: int = year // 10 * 10
+            position: typing.Optional[int] = self.positions.get((item_id, page))
+            if position is None:
+                position = len(self.item_ids)
+                self.positions[(item_id, page)] = position
+                self.item_ids.append(item_id)
+                self.pages.append(page)
+                self.image_ids.append(image_id)
+                self.years.append(year)
+                self.add_to_bucket((None, None), position)
+                self.add_to_bucket((None, decade), position)
+            else:
+                # Re-ingested, e.g. use_blob_ids pointing images at their content digests
+                self.image_ids[position] = image_id
+                previous: int = self.years[position] // 10 * 10
+                self.years[position] = year
+                if previous != decade:
+                    self.move_decade(position, previous, decade)
+            if collection is not None and (position, collection) not in self.memberships:
+                self.memberships.add((position, collection))
+                self.add_to_bucket((collection, None), position)
+                self.add_to_bucket((collection, decade), position)
+
+    def add_rows(self, rows: typing.Iterable[tuple]) -> None:
+        for item_id, page, image_id, year, collection in rows:
+            if year is not None:
+                self.add(item_id, page, image_id, year, collection)
+
+    def refresh(self) -> int:
+        before: int = len(self)
+        with self.handler.cursor() as cursor:
+            self.handler.execute(cursor, self.query)
+            rows: list = cursor.fetchall()
+        self.add_rows(rows)
+        return len(self) - before
+
+    def items_ingested(self, keys: typing.List[typing.Tuple[str, int]]) -> None:
+        with self.lock:
+            if self.rebuild_ingested is not None:
+                self.rebuild_ingested += keys
+        for start in range(0, len(keys), self.chunk_size):
+            chunk: list = keys[start : start + self.chunk_size]
+            placeholders: str = ", ".join(["(?, ?)"] * len(chunk))
+            parameters: list = [value for key in chunk for value in key]
+            with self.handler.cursor() as cursor:
+                self.handler.execute(
+                    cursor,
+                    f"{self.query} AND (i.item_id, i.page) IN ({placeholders})",
+                    parameters,
+                )
+                rows: list = cursor.fetchall()
+            self.add_rows(rows)
+
+    def items_deleted(self) -> None:
+        self.clear()
+
+    def items_unplayable(self, keys: typing.List[typing.Tuple[str, int]]) -> None:
+        # Slots are append-only, so rebuild without the affected items. The new index is
+        # loaded without holding the lock, sampling keeps using the old one until the swap
+        with self.rebuild_lock:
+            with self.lock:
+                self.rebuild_ingested = []
+            try:
+                rebuilt: RoundIndex = RoundIndex(self.handler, self.chunk_size, listen=False)
+                rebuilt.refresh()
+                with self.lock:
+                    for name in self.state:
+                        setattr(self, name, getattr(rebuilt, name))
+            finally:
+                with self.lock:
+                    ingested, self.rebuild_ingested = self.rebuild_ingested, None
+            # The rebuild may have read before these were committed
+            if ingested:
+                self.items_ingested(ingested)
+
+    def entry(self, position: int) -> typing.Tuple[str, int, str, int]:
+        return (
+            self.item_ids[position],
+            self.pages[position],
+            self.image_ids[position],
+            self.years[position],
+        )
+
+    def sample(
+        self,
+        collection: typing.Optional[str] = None,
+        decade: typing.Optional[int] = None,
+        exclude: typing.Optional[typing.Set[typing.Tuple[str, int]]] = None,
+        attempts: int = 16,
+    ) -> typing.Tuple[str, int, str, int]:
+        with self.lock:
+            bucket: typing.Optional[array.array] = self.buckets.get((collection, decade))
+            if not bucket:
+                raise KeyError(f"No playable items for {collection}/{decade}")
+            for _ in range(attempts):
+                position: int = random.choice(bucket)
+                if not exclude or (self.item_ids[position], self.pages[position]) not in exclude:
+                    return self.entry(position)
+            # Mostly seen already, fall back to a scan of the bucket
+            unseen: list = [
+                position
+                for position in bucket
+                if (self.item_ids[position], self.pages[position]) not in exclude
+            ]
+            if not unseen:
+                raise KeyError(f"No unseen items left for {collection}/{decade}")
+            return self.entry(random.choice(unseen))
@@ -0,0 +1,285 @@
+import argparse
+import array
+import mmap
+import os
+import random
+import struct
+import sys
+import tempfile
+import typing
+
+# Header, then 8 byte aligned sections in the order of SECTIONS, all in native byte order:
+# rows are sorted by year so a decade is a contiguous range, collections list their rows
+# ascending so their years are sorted as well
+MAGIC: bytes = b"YGRS"
+VERSION: int = 1
+HEADER: struct.Struct = struct.Struct("<4sHBxIII")
+SECTIONS: typing.Tuple[typing.Tuple[str, str], ...] = (
+    ("years", "h"),
+    ("pages", "I"),
+    ("item_ids", "I"),
+    ("date_raws", "I"),
+    ("image_ids", "B"),
+    ("string_offsets", "I"),
+    ("strings", "B"),
+    ("collection_names", "I"),
+    ("collection_offsets", "I"),
+    ("collection_rows", "I"),
+)
+SECTION_TABLE: struct.Struct = struct.Struct(f"<{2 * len(SECTIONS)}Q")
+IMAGE_ID_BYTES: int = 32
+NO_STRING: int = 0xFFFFFFFF
+BYTE_ORDERS: typing.Dict[str, int] = {"little": 0, "big": 1}
+
+
+class StringTable:
+    def __init__(self) -> None:
+        self.indexes: typing.Dict[str, int] = {}
+        self.offsets: array.array = array.array("I", [0])
+        self.data: bytearray = bytearray()
+
+    def add(self, value: typing.Optional[str]) -> int:
+        if value is None:
+            return NO_STRING
+        index: typing.Optional[int] = self.indexes.get(value)
+        if index is None:
+            index = len(self.indexes)
+            self.indexes[value] = index
+            self.data += value.encode("utf-8")
+            self.offsets.append(len(self.data))
+        return index
+
+
+def write_snapshot(rows: typing.Iterable[tuple], path: str) -> int:
+    # rows are (item_id, page, image_id, year, date_raw, collection_id), one per membership
+    items: typing.Dict[typing.Tuple[str, int], list] = {}
+    for item_id, page, image_id, year, date_raw, collection_id in rows:
+        if year is None:
+            continue
+        key: tuple = (item_id, page)
+        if key not in items:
+            items[key] = [item_id, page, image_id, int(year), date_raw, set()]
+        if collection_id is not None:
+            items[key][5].add(collection_id)
+    ordered: list = sorted(items.values(), key=lambda item: (item[3], item[0], item[1]))
+
+    strings = StringTable()
+    columns: typing.Dict[str, array.array] = {name: array.array(code) for name, code in SECTIONS}
+    memberships: typing.Dict[str, array.array] = {}
+    for row, (item_id, page, image_id, year, date_raw, collections) in enumerate(ordered):
+        image_bytes: bytes = bytes.fromhex(image_id)
+        if len(image_bytes) != IMAGE_ID_BYTES:
+            raise ValueError(f"Image id {image_id} of {item_id}/{page} is not a sha256 digest")
+        columns["years"].append(year)
+        columns["pages"].append(page)
+        columns["item_ids"].append(strings.add(item_id))
+        columns["date_raws"].append(strings.add(date_raw))
+        columns["image_ids"].frombytes(image_bytes)
+        for collection_id in collections:
+            memberships.setdefault(collection_id, array.array("I")).append(row)
+    columns["collection_offsets"].append(0)
+    for collection_id in sorted(memberships):
+        columns["collection_names"].append(strings.add(collection_id))
+        columns["collection_rows"].extend(memberships[collection_id])
+        columns["collection_offsets"].append(len(columns["collection_rows"]))
+    columns["string_offsets"] = strings.offsets
+    columns["strings"].frombytes(bytes(strings.data))
+
+    # Written next to the target and swapped in, open readers keep the old file
+    directory: str = os.path.dirname(os.path.abspath(path))
+    file_descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(file_descriptor, "wb") as output:
+            position: int = HEADER.size + SECTION_TABLE.size
+            table: list = []
+            for name, _ in SECTIONS:
+                position += -position % 8
+                table += [position, len(columns[name])]
+                position += len(columns[name]) * columns[name].itemsize
+            output.write(
+                HEADER.pack(
+                    MAGIC,
+                    VERSION,
+                    BYTE_ORDERS[sys.byteorder],
+                    len(ordered),
+                    len(strings.indexes),
+                    len(memberships),
+                )
+            )
+            output.write(SECTION_TABLE.pack(*table))
+            for (name, _), offset in zip(SECTIONS, table[::2]):
+                output.write(b"\0" * (offset - output.tell()))
+                columns[name].tofile(output)
+        # mkstemp files are private, serving processes may run as another user
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return len(ordered)
+
+
+def export_snapshot(handler, path: str, chunk_size: int = 10000) -> int:
+    query: str = (
+        "SELECT i.item_id, i.page, im.image_id, YEAR(i.date), i.date_raw, ci.collection_id "
+        "FROM items i "
+        "JOIN images im ON (im.item_id = i.item_id AND im.page = i.page) "
+        "LEFT JOIN collection_items ci ON (ci.item_id = i.item_id AND ci.page = i.page) "
+        "WHERE i.date IS NOT NULL AND i.playable = 1"
+    )
+
+    def stream() -> typing.Iterator[tuple]:
+        # Unbuffered, a buffered cursor would hold the whole result before the first fetchmany
+        with handler.cursor(buffered=False) as cursor:
+            handler.execute(cursor, query)
+            while True:
+                rows: list = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield from rows
+
+    return write_snapshot(stream(), path)
+
+
+class RoundSnapshot:
+    # Read-only view of a snapshot, every column is a memoryview straight onto the mmap
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(self.path, "rb") as snapshot_file:
+            self.stat: os.stat_result = os.fstat(snapshot_file.fileno())
+            self.map: mmap.mmap = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, byte_order, self.count, _, collection_count = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} is not a version {VERSION} round snapshot")
+        if byte_order != BYTE_ORDERS[sys.byteorder]:
+            raise ValueError(f"{self.path} was written on a machine with another byte order")
+        table: tuple = SECTION_TABLE.unpack_from(self.map, HEADER.size)
+        view: memoryview = memoryview(self.map)
+        for index, (name, code) in enumerate(SECTIONS):
+            offset, length = table[2 * index], table[2 * index + 1]
+            size: int = struct.calcsize(code)
+            setattr(self, name, view[offset : offset + length * size].cast(code))
+        self.collection_indexes: typing.Dict[str, int] = {
+            self.string(self.collection_names[index]): index for index in range(collection_count)
+        }
+
+    def close(self) -> None:
+        for name, _ in SECTIONS:
+            getattr(self, name).release()
+        self.map.close()
+
+    def reopened(self) -> "RoundSnapshot":
+        # Picks up a snapshot swapped in by another process, cheap enough to call per request.
+        # Returns a new instance so callers switch over with one assignment
+        current: os.stat_result = os.stat(self.path)
+        if (current.st_ino, current.st_mtime_ns) == (self.stat.st_ino, self.stat.st_mtime_ns):
+            return self
+        return RoundSnapshot(self.path)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def collections(self) -> typing.List[str]:
+        return sorted(self.collection_indexes)
+
+    def string(self, index: int) -> typing.Optional[str]:
+        if index == NO_STRING:
+            return None
+        start, end = self.string_offsets[index], self.string_offsets[index + 1]
+        return bytes(self.strings[start:end]).decode("utf-8")
+
+    def image_id(self, row: int) -> str:
+        return self.image_ids[row * IMAGE_ID_BYTES : (row + 1) * IMAGE_ID_BYTES].hex()
+
+    def entry(self, row: int) -> typing.Tuple[str, int, str, int]:
+        # Same shape as RoundIndex.entry
+        return (self.string(self.item_ids[row]), self.pages[row], self.image_id(row), self.years[row])
+
+    def date_raw(self, row: int) -> typing.Optional[str]:
+        return self.string(self.date_raws[row])
+
+    def lower_bound(self, rows: typing.Optional[memoryview], low: int, high: int, year: int) -> int:
+        # First position in [low, high) whose year is >= year
+        while low < high:
+            middle: int = (low + high) // 2
+            row: int = rows[middle] if rows is not None else middle
+            if self.years[row] < year:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def candidates(
+        self, collection: typing.Optional[str], decade: typing.Optional[int]
+    ) -> typing.Tuple[typing.Optional[memoryview], int, int]:
+        # (row list or None for all rows, start, end) covering the requested bucket
+        rows: typing.Optional[memoryview] = None
+        low, high = 0, self.count
+        if collection is not None:
+            index: typing.Optional[int] = self.collection_indexes.get(collection)
+            if index is None:
+                return None, 0, 0
+            rows = self.collection_rows
+            low, high = self.collection_offsets[index], self.collection_offsets[index + 1]
+        if decade is not None:
+            low, high = (
+                self.lower_bound(rows, low, high, decade),
+                self.lower_bound(rows, low, high, decade + 10),
+            )
+        return rows, low, high
+
+    def sample(
+        self,
+        collection: typing.Optional[str] = None,
+        decade: typing.Optional[int] = None,
+        exclude: typing.Optional[typing.Set[typing.Tuple[str, int]]] = None,
+        attempts: int = 16,
+    ) -> typing.Tuple[str, int, str, int]:
+        # Drop-in for RoundIndex.sample without a database behind it
+        rows, low, high = self.candidates(collection, decade)
+        if low >= high:
+            raise KeyError(f"No playable items for {collection}/{decade}")
+        for _ in range(attempts):
+            position: int = random.randrange(low, high)
+            entry: tuple = self.entry(rows[position] if rows is not None else position)
+            if not exclude or entry[:2] not in exclude:
+                return entry
+        # Mostly seen already, fall back to a scan of the range
+        unseen: list = [
+            entry
+            for entry in (
+                self.entry(rows[position] if rows is not None else position)
+                for position in range(low, high)
+            )
+            if entry[:2] not in exclude
+        ]
+        if not unseen:
+            raise KeyError(f"No unseen items left for {collection}/{decade}")
+        return random.choice(unseen)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory-mappable snapshot of the playable items")
+    parser.add_argument("command", choices=["export", "info", "sample"])
+    parser.add_argument("--snapshot", default="./rounds.snapshot")
+    parser.add_argument("--config", default="./db_access.json")
+    parser.add_argument("--collection", default=None)
+    parser.add_argument("--decade", type=int, default=None)
+    parser.add_argument("--count", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        from db_handler import DBHandler
+
+        print(f"Exported {export_snapshot(DBHandler(args.config), args.snapshot)} items to {args.snapshot}")
+    else:
+        snapshot = RoundSnapshot(args.snapshot)
+        if args.command == "info":
+            print(f"{len(snapshot)} items, {os.path.getsize(args.snapshot)} bytes")
+            for collection in snapshot.collections():
+                _, low, high = snapshot.candidates(collection, None)
+                print(f"{collection}: {high - low} items")
+        else:
+            for _ in range(args.count):
+                print(snapshot.sample(args.collection, args.decade))
+        snapshot.close()